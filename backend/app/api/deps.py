@@ -1,25 +1,44 @@
 from typing import Annotated
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 from app.core.database import get_db
 from app.core.config import settings
+from app.core.container import ServiceContainer
 from app.models.user import User
+from app.services.session_registry import Principal, hash_token
 from app.schemas.token import TokenPayload
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
+def get_services(request: Request) -> ServiceContainer:
+    """Shared service container created by the application lifespan."""
+    return request.app.state.services
+
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[AsyncSession, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_db)],
+    services: Annotated[ServiceContainer, Depends(get_services)]
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    sessions = services.session_registry
+    token_hash = hash_token(token)
+    if sessions.is_revoked(token_hash):
+        raise credentials_exception
+
+    principal = sessions.get_principal(token_hash)
+    if principal is not None:
+        # Re-seed the profile cache; a newer version already cached wins
+        services.profile_cache.put(principal.user.id, principal.profile)
+        return principal.user
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
@@ -29,9 +48,16 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
         
-    result = await db.execute(select(User).where(User.username == token_data.sub))
+    # The profile comes along in the same query (LEFT JOIN) and refreshes the profile cache
+    result = await db.execute(
+        select(User).options(joinedload(User.profile)).where(User.username == token_data.sub)
+    )
     user = result.scalar_one_or_none()
     
     if user is None:
         raise credentials_exception
+    profile = services.profile_cache.put(user.id, user.profile)
+    # Shared across requests from now on, so it must not belong to this session
+    db.expunge(user)
+    sessions.cache_principal(token_hash, Principal(user, profile), payload["exp"])
     return user
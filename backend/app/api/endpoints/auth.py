@@ -1,9 +1,18 @@
-from datetime import timedelta
+import asyncio
+import uuid
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
+from jose import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from app.api.deps import get_current_user, get_services, oauth2_scheme
+from app.core.admission import AdmissionRejected
+from app.core.container import ServiceContainer
+from app.core.executors import ExecutorSaturated
+from app.core.metrics import metrics
 from app.core.database import get_db
 from app.core.config import settings
 from app.services.auth_service import AuthService
@@ -13,10 +22,49 @@ from app.schemas.user import UserCreate, User as UserSchema
 
 router = APIRouter()
 
+def client_address(request: Request) -> str:
+    """
+    The caller's IP. When the direct peer is one of TRUSTED_PROXY_IPS, the
+    right-most X-Forwarded-For entry that is not itself a trusted proxy is used
+    (entries left of it are client-supplied and can be forged).
+    """
+    peer = request.client.host if request.client else "unknown"
+    trusted = {ip.strip() for ip in settings.TRUSTED_PROXY_IPS.split(",") if ip.strip()}
+    if peer not in trusted:
+        return peer
+    for hop in reversed(request.headers.get("x-forwarded-for", "").split(",")):
+        hop = hop.strip()
+        if hop and hop not in trusted:
+            return hop
+    return peer
+
+@asynccontextmanager
+async def password_hashing_slot(services: ServiceContainer, request: Request, username: str):
+    """
+    Admission control in front of the bcrypt pool: per (username, client IP), and
+    per client IP when enabled. Keyed on the pair so a flood of bogus logins for
+    someone's username only queues behind itself instead of locking them out.
+    """
+    client = client_address(request)
+    try:
+        async with AsyncExitStack() as stack:
+            if settings.LOGIN_PER_IP_LIMIT_ENABLED:
+                await stack.enter_async_context(services.login_admission.admit(f"ip:{client}"))
+            await stack.enter_async_context(services.login_admission.admit(f"user:{username}|{client}"))
+            yield
+    except (AdmissionRejected, ExecutorSaturated, asyncio.TimeoutError):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
 @router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
 async def register(
     user_in: UserCreate,
-    db: Annotated[AsyncSession, Depends(get_db)]
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    services: Annotated[ServiceContainer, Depends(get_services)]
 ):
     # Check if user exists
     result = await db.execute(select(User).where(User.username == user_in.username))
@@ -27,7 +75,8 @@ async def register(
         )
     
     # Create user
-    hashed_password = AuthService.get_password_hash(user_in.password)
+    async with password_hashing_slot(services, request, user_in.username):
+        hashed_password = await services.password_hasher.hash(user_in.password)
     new_user = User(
         username=user_in.username,
         password_hash=hashed_password
@@ -41,24 +90,41 @@ async def register(
 @router.post("/login", response_model=Token)
 async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Annotated[AsyncSession, Depends(get_db)]
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    services: Annotated[ServiceContainer, Depends(get_services)]
 ):
     # Authenticate user
     result = await db.execute(select(User).where(User.username == form_data.username))
     user = result.scalar_one_or_none()
     
-    if not user or not AuthService.verify_password(form_data.password, user.password_hash):
+    valid, new_hash = False, None
+    if user:
+        async with password_hashing_slot(services, request, form_data.username):
+            valid, new_hash = await services.password_hasher.verify_and_update(form_data.password, user.password_hash)
+    
+    if not valid:
         # Req 1.3: Reject without revealing which field is incorrect
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was made; committed with the login record below
+        user.password_hash = new_hash
+        metrics.incr("auth.rehashed")
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = AuthService.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        # jti: two logins in the same second must still get distinct (separately revocable) tokens
+        data={"sub": user.username, "jti": uuid.uuid4().hex}, expires_delta=access_token_expires
+    )
+    # Recorded so that /logout can revoke it
+    await services.session_registry.record_login(
+        db, access_token, user.id, datetime.now(timezone.utc).replace(tzinfo=None) + access_token_expires
     )
     
     return Token(
@@ -68,7 +134,13 @@ async def login(
     )
 
 @router.post("/logout")
-async def logout():
-    # Since we are using stateless JWT, client should discard the token.
-    # In a real implementation with session_tokens table, we would invalidate it here.
+async def logout(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    services: Annotated[ServiceContainer, Depends(get_services)]
+):
+    # Revoke the presented token; get_current_user has already verified it
+    expires_at = datetime.fromtimestamp(jwt.get_unverified_claims(token)["exp"], timezone.utc).replace(tzinfo=None)
+    await services.session_registry.revoke(db, token, current_user.id, expires_at)
     return {"message": "Successfully logged out"}
@@ -0,0 +1,49 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+from app.core.metrics import metrics
+
+class AdmissionRejected(Exception):
+    """Raised when a key already has its maximum of running + waiting requests."""
+
+class _Slot:
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0  # running + waiting; the slot is dropped at zero
+
+class KeyedAdmission:
+    """
+    Per-key concurrency limit (e.g. per client IP or username): up to
+    `max_active` requests per key run at once, up to `max_waiting` more wait
+    their turn, anything beyond is rejected. Event-loop only; idle keys hold
+    no memory. Admissions, waits and rejections are counted under `<name>.*`.
+    """
+
+    def __init__(self, name: str, max_active: int, max_waiting: int):
+        self.name = name
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self._slots: Dict[str, _Slot] = {}
+
+    @asynccontextmanager
+    async def admit(self, key: str) -> AsyncIterator[None]:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot(self.max_active)
+        if slot.users >= self.max_active + self.max_waiting:
+            metrics.incr(f"{self.name}.rejected")
+            raise AdmissionRejected(f"{self.name}: too many concurrent requests for this client")
+
+        slot.users += 1
+        try:
+            if slot.semaphore.locked():
+                metrics.incr(f"{self.name}.queued")
+            async with slot.semaphore:
+                metrics.incr(f"{self.name}.admitted")
+                yield
+        finally:
+            slot.users -= 1
+            if not slot.users:
+                del self._slots[key]
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, List, Set, Tuple, TypeVar
+from app.core.metrics import metrics
+
+I = TypeVar("I")
+R = TypeVar("R")
+
+class MicroBatcher(Generic[I, R]):
+    """
+    Coalesces items submitted by concurrent callers into one batch call.
+    A batch is flushed `window_ms` after its first item arrives or as soon as it
+    holds `max_batch` items. `process_batch` must return one result per item, in
+    order; each caller gets its own result (or the batch's exception).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process_batch: Callable[[List[I]], Awaitable[List[R]]],
+        window_ms: float,
+        max_batch: int,
+    ):
+        self.name = name
+        self.process_batch = process_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[I, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: I) -> R:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[I, asyncio.Future]]) -> None:
+        metrics.observe(f"{self.name}.batch_size", len(batch))
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            # Callers that went away (cancelled) simply don't get their result
+            if not future.done():
+                future.set_result(result)
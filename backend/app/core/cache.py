@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, List, Optional, Tuple, TypeVar
+from app.core.metrics import metrics
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING = object()
+
+class TTLCache(Generic[K, V]):
+    """
+    Size-bounded LRU cache with a per-entry TTL. Hits, misses and evictions are
+    counted under `<name>.*` metrics. Meant to be used from the event loop only.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl_seconds: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl_seconds
+        self._data: "OrderedDict[K, tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                metrics.incr(f"{self.name}.hits")
+                return value
+            del self._data[key]
+        self.misses += 1
+        metrics.incr(f"{self.name}.misses")
+        return default
+
+    def set(self, key: K, value: V, ttl_seconds: float | None = None) -> None:
+        ttl = self.ttl if ttl_seconds is None else ttl_seconds
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            metrics.incr(f"{self.name}.evictions")
+
+    def peek(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Live value without touching LRU order or the hit/miss counters."""
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING and entry[0] > time.monotonic():
+            return entry[1]
+        return default
+
+    def invalidate(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+        metrics.incr(f"{self.name}.clears")
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        entry = self._data.get(key, _MISSING)
+        return entry is not _MISSING and entry[0] > time.monotonic()
+
+    def items(self) -> List[Tuple[K, V, float]]:
+        """Live entries as (key, value, remaining TTL in seconds), oldest first; for persistence."""
+        now = time.monotonic()
+        return [(key, value, expires_at - now) for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
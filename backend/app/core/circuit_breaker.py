@@ -0,0 +1,54 @@
+import time
+from app.core.metrics import metrics
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for an upstream dependency.
+    After `failure_threshold` failures in a row the circuit opens and `allow`
+    returns False for `reset_seconds`; then a single probe call is let through
+    (half-open) and its outcome closes or re-opens the circuit. A call that
+    ends without an outcome (cancelled) must report `record_cancelled`, which
+    frees the probe slot for the next caller.
+    State is exported as the `<name>.open` gauge (0 closed, 1 open).
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self._probing and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._probing = True
+            return True
+        metrics.incr(f"{self.name}.rejected")
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            metrics.gauge(f"{self.name}.open", 0)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_cancelled(self) -> None:
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+            # Failed probe restarts the open period
+            if self.opened_at is None:
+                metrics.incr(f"{self.name}.opened")
+            self.opened_at = time.monotonic()
+            self._probing = False
+            metrics.gauge(f"{self.name}.open", 1)
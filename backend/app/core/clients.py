@@ -0,0 +1,37 @@
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from app.core.config import settings
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+def create_llm_http_client() -> httpx.AsyncClient:
+    """HTTP/2 keep-alive pool for the OpenAI-compatible LLM endpoint."""
+    return DefaultAsyncHttpxClient(
+        http2=settings.HTTP2_ENABLED,
+        limits=_pool_limits(),
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=10.0),
+    )
+
+def create_search_http_client() -> httpx.AsyncClient:
+    """HTTP/2 keep-alive pool for the Tavily search API."""
+    return httpx.AsyncClient(
+        base_url=settings.TAVILY_BASE_URL,
+        http2=settings.HTTP2_ENABLED,
+        limits=_pool_limits(),
+        timeout=httpx.Timeout(settings.TAVILY_TIMEOUT_SECONDS, connect=5.0),
+    )
+
+def create_llm_client(http_client: httpx.AsyncClient | None = None) -> AsyncOpenAI | None:
+    """Build the LLM client, or None when no API key is configured."""
+    if not settings.OPENAI_API_KEY:
+        return None
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=http_client,
+    )
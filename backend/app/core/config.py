@@ -10,6 +10,27 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
     ALGORITHM: str = "HS256"
     
+    # Authenticated principal cache and token revocation
+    PRINCIPAL_CACHE_SIZE: int = 10000  # token hash -> user + profile snapshot
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60.0
+    REVOCATION_REFRESH_SECONDS: float = 30.0  # how soon a logout on another worker applies here
+    
+    # Password hashing (bcrypt) runs on its own bounded pool; changing the cost rehashes on next login
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    # Beyond the queue, /login and /register answer 429. 0 sizes it at startup from one
+    # measured hash so a full queue drains within PASSWORD_HASH_MAX_WAIT_SECONDS
+    PASSWORD_HASH_QUEUE_DEPTH: int = 0
+    PASSWORD_HASH_MAX_WAIT_SECONDS: float = 1.0
+    PASSWORD_HASH_TIMEOUT_SECONDS: float = 3.0
+    LOGIN_MAX_ACTIVE_PER_CLIENT: int = 2  # concurrent hash jobs per (username, client IP), and per IP if enabled
+    LOGIN_MAX_WAITING_PER_CLIENT: int = 4
+    # Per-IP login limiting is opt-in: behind a reverse proxy every request comes from the
+    # proxy's address and all logins would share one limit. Enable it when clients connect
+    # directly, or list the proxies whose X-Forwarded-For header is trusted.
+    LOGIN_PER_IP_LIMIT_ENABLED: bool = False
+    TRUSTED_PROXY_IPS: str = ""  # comma-separated, e.g. "127.0.0.1,10.0.0.2"
+    
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./skintech.db"
     
@@ -17,14 +38,142 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = None
     OPENAI_BASE_URL: str = "https://api.deepseek.com"
     OPENAI_MODEL: str = "deepseek-chat"
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    LLM_DISCONNECT_POLL_SECONDS: float = 0.5  # how often a streaming reply checks for a gone client
+    LLM_STREAM_USAGE: bool = True  # request usage (incl. prompt-cache hits) on streamed replies
+
+    # SSE frame coalescing; 0 keeps one frame per upstream chunk. Cuts frames and wire
+    # bytes (~4x at 50 ms) for slow clients/proxies; server CPU is unchanged within noise
+    SSE_FLUSH_INTERVAL_MS: float = 0.0
+    SSE_FLUSH_MAX_BYTES: int = 512
     
     # Tavily
     TAVILY_API_KEY: str = None
+    TAVILY_BASE_URL: str = "https://api.tavily.com"
+    TAVILY_TIMEOUT_SECONDS: float = 10.0
+
+    # Web search resilience: result cache, hard per-call timeout, circuit breaker
+    WEB_SEARCH_CACHE_SIZE: int = 1024
+    WEB_SEARCH_CACHE_TTL_SECONDS: float = 600.0
+    WEB_SEARCH_STALE_TTL_SECONDS: float = 86400.0  # served while Tavily is failing
+    WEB_SEARCH_TIMEOUT_SECONDS: float = 3.0
+    WEB_SEARCH_BREAKER_FAILURES: int = 5
+    WEB_SEARCH_BREAKER_RESET_SECONDS: float = 30.0
+
+    # Shared HTTP connection pools (LLM + Tavily)
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
     
+    # Intent keyword dictionaries (one <intent>.txt per intent, hot-reloaded)
+    INTENT_KEYWORDS_DIRECTORY: str = "./app/data/intent_keywords"
+    INTENT_KEYWORDS_RELOAD_SECONDS: float = 5.0
+    INTENT_CATALOG_TERM_WEIGHT: float = 1.0
+
+    # Memoized fallback intent decisions, keyed by normalized query text
+    INTENT_MEMO_SIZE: int = 10000
+    INTENT_MEMO_TTL_SECONDS: float = 86400.0
+    INTENT_MEMO_PATH: str = ""  # warm-start file; empty disables persistence
+
+    # Opt-in semantic cache of product-knowledge answers (first turn of a conversation only)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_SIZE: int = 2048
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600.0
+    RESPONSE_CACHE_SIMILARITY: float = 0.95
+    RESPONSE_CACHE_REPLAY_CHUNK_CHARS: int = 16
+
+    # Prompt token budget (ContextAssembler)
+    CONTEXT_MAX_TOKENS: int = 4096
+    CONTEXT_QUERY_MAX_TOKENS: int = 1024
+    CONTEXT_HISTORY_MESSAGES: int = 10  # recent window sent verbatim; older turns live in the summary
+    CONTEXT_MESSAGE_MAX_TOKENS: int = 512
+    CONTEXT_SNIPPET_MAX_TOKENS: int = 200
+    CONTEXT_MIN_SEGMENT_TOKENS: int = 32  # don't keep a truncated turn shorter than this
+    PROMPT_TIME_GRANULARITY_MINUTES: int = 60  # time shown to the model is floored to this
+    TOKENIZER_ENCODING: str = "cl100k_base"  # used when tiktoken is installed; "" forces the estimator
+
+    # Rolling conversation summaries (background, LLM-generated)
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_TRIGGER_MESSAGES: int = 6  # summarize once this many messages fall out of the recent window
+    SUMMARY_MAX_TOKENS: int = 300
+    SUMMARY_MAX_BATCH: int = 100  # messages folded in per run
+
+    # Write-behind message persistence: one transaction per batch of chat turns
+    MESSAGE_WRITE_ACK: str = "commit"  # "commit": reply finishes after the batch commits; "enqueue": right away
+    MESSAGE_WRITER_BATCH_MS: float = 5.0  # how long the writer gathers turns before committing
+    MESSAGE_WRITER_MAX_BATCH: int = 200  # turns per transaction
+    MESSAGE_WRITER_MAX_QUEUE: int = 5000  # writers block (backpressure) beyond this many queued turns
+    MESSAGE_WRITER_RETRIES: int = 2
+
+    # Background profile extraction (debounced per user, bounded worker pool)
+    PROFILE_EXTRACTION_ENABLED: bool = True
+    PROFILE_EXTRACTION_TRIGGER_TURNS: int = 3  # extract after this many new turns...
+    PROFILE_EXTRACTION_IDLE_SECONDS: float = 60.0  # ...or once the user has been quiet this long
+    PROFILE_EXTRACTION_WORKERS: int = 2
+    PROFILE_EXTRACTION_MAX_MESSAGES: int = 20  # messages since the watermark sent per job
+
+    # Version-tagged in-process profile cache; profile writes are CAS on UserProfile.version
+    PROFILE_CACHE_SIZE: int = 10000
+    PROFILE_CACHE_TTL_SECONDS: float = 300.0  # bounds staleness of updates made by other workers
+    PROFILE_UPDATE_MAX_RETRIES: int = 3
+
+    # Local embedding intent classifier (consulted before the LLM fallback)
+    INTENT_LOCAL_CLASSIFIER_ENABLED: bool = True
+    INTENT_SEEDS_PATH: str = "./app/data/intent_seeds.json"
+    INTENT_LOCAL_MIN_CONFIDENCE: float = 0.75
+    INTENT_LOCAL_CLASSIFIER_RETRY_SECONDS: float = 30.0  # after a failed seed load
+
     # ChromaDB
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
     CHROMA_COLLECTION_NAME: str = "skincare_products"
 
+    # Vector backend: "chroma" (persistent HNSW) or "numpy" (exact flat index
+    # mmap'd from the snapshot ingestion writes to NUMPY_INDEX_DIRECTORY)
+    VECTOR_BACKEND: str = "chroma"
+    NUMPY_INDEX_DIRECTORY: str = "./vector_index"
+    NUMPY_INDEX_DTYPE: str = "float32"  # or "float16"
+
+    # Incremental ingestion (content-hash manifest, process-pool embedding)
+    INGEST_MANIFEST_PATH: str = "./chroma_db/ingest_manifest.json"
+    INGEST_WORKERS: int = 0  # 0 = os.cpu_count()
+    # Deletions are refused (unless --allow-mass-delete) when the input file has no
+    # products or would remove more than this fraction of the indexed catalog
+    INGEST_MAX_DELETE_FRACTION: float = 0.5
+    # Ingestion runs as a separate CLI process; the server polls the manifest it writes
+    # last and reloads product store / indexes / caches when it changes (0 disables)
+    CATALOG_WATCH_SECONDS: float = 10.0
+
+    # Vector search executor (embedding + HNSW search run off the event loop)
+    VECTOR_EXECUTOR_WORKERS: int = 4
+    VECTOR_EXECUTOR_QUEUE_DEPTH: int = 32
+    VECTOR_QUERY_TIMEOUT_SECONDS: float = 2.0
+
+    # Micro-batching of query embedding + search across concurrent requests
+    EMBED_BATCH_WINDOW_MS: float = 5.0
+    EMBED_BATCH_MAX_SIZE: int = 32
+
+    # Restrict retrieval to products matching the user's skin type, budget and sensitivities
+    RAG_PROFILE_FILTERS_ENABLED: bool = True
+    # Collections ingested before the filter flags existed (no `skin:*` metadata) match
+    # nothing when filtered: such queries are retried unfiltered over this many
+    # candidates and filtered on the decoded products. Re-ingest with --full to drop the cost.
+    RAG_FILTER_FALLBACK_CANDIDATES: int = 100
+
+    # Hybrid retrieval: BM25 over ingredients/efficacy/brand/name fused with vector ranks (RRF)
+    HYBRID_RETRIEVAL_ENABLED: bool = True
+    HYBRID_RRF_K: int = 60
+    HYBRID_CANDIDATES: int = 20
+    # BM25 score a product needs to be admitted on a literal match alone (no vector
+    # match). An ingredient/efficacy/brand hit scores ~3+, a product-type word ("精华") ~2.5
+    HYBRID_LEXICAL_MIN_SCORE: float = 2.75
+
+    # RAG caches: normalized query -> embedding, (embedding, params) -> RAGResult
+    RAG_EMBEDDING_CACHE_SIZE: int = 4096
+    RAG_EMBEDDING_CACHE_TTL_SECONDS: float = 3600.0
+    RAG_RESULT_CACHE_SIZE: int = 1024
+    RAG_RESULT_CACHE_TTL_SECONDS: float = 300.0
+
     class Config:
         env_file = ".env"
         case_sensitive = True
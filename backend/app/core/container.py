@@ -0,0 +1,129 @@
+import logging
+from app.core.config import settings
+from app.core.clients import create_llm_http_client, create_search_http_client, create_llm_client
+from app.core.vector_db import CatalogWatcher, get_vector_store, get_embedding_function, on_catalog_changed
+from app.services.intent_router import IntentRouter
+from app.services.intent_classifier import EmbeddingIntentClassifier
+from app.services.intent_keywords import IntentKeywordDictionary
+from app.services.rag_service import RAGService, create_vector_executor
+from app.services.product_store import ProductStore
+from app.services.lexical_index import LexicalIndex
+from app.services.web_search_service import WebSearchService
+from app.services.context_assembler import ContextAssembler
+from app.services.response_cache import SemanticResponseCache
+from app.services.conversation_summarizer import ConversationSummarizer
+from app.services.profile_scheduler import ProfileExtractionScheduler
+from app.services.profile_cache import ProfileCache
+from app.services.session_registry import SessionRegistry
+from app.services.auth_service import PasswordHasher
+from app.core.admission import KeyedAdmission
+from app.services.message_writer import MessageWriter
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """
+    Application-lifetime registry of shared clients and stateless services.
+    Created once by the FastAPI lifespan; per-request objects (ChatService,
+    ProfileExtractionAgent) only add an AsyncSession on top of it.
+    """
+
+    def __init__(self):
+        # One keep-alive pool per upstream, shared by every request
+        self.llm_http_client = create_llm_http_client()
+        self.search_http_client = create_search_http_client()
+        self.llm_client = create_llm_client(self.llm_http_client)
+
+        # Reloads everything registered with on_catalog_changed after a CLI ingestion run
+        self.catalog_watcher = CatalogWatcher()
+
+        # One embedding model and vector store handle (Chroma or NumPy flat index)
+        self.embedding_function = get_embedding_function()
+        self.vector_store = get_vector_store(embedding_function=self.embedding_function)
+
+        # Decoded once; reloaded (atomically) whenever ingestion changes the catalog
+        self.product_store = ProductStore(self.vector_store)
+        on_catalog_changed(self.product_store.reload)
+        self.lexical_index = LexicalIndex(self.product_store) if settings.HYBRID_RETRIEVAL_ENABLED else None
+        if self.lexical_index:
+            on_catalog_changed(self.lexical_index.rebuild)
+
+        self.vector_executor = create_vector_executor()
+
+        # Keyword automaton includes catalog brands/ingredients, so rebuild it with the catalog
+        self.intent_keywords = IntentKeywordDictionary(settings.INTENT_KEYWORDS_DIRECTORY, self.product_store)
+        on_catalog_changed(self.intent_keywords.reload)
+        self.intent_router = IntentRouter(client=self.llm_client, keywords=self.intent_keywords)
+        self.rag_service = RAGService(
+            store=self.vector_store,
+            executor=self.vector_executor,
+            embedding_function=self.embedding_function,
+            product_store=self.product_store,
+            lexical_index=self.lexical_index
+        )
+        self.web_search_service = WebSearchService(http_client=self.search_http_client)
+        self.context_assembler = ContextAssembler()
+        self.conversation_summarizer = ConversationSummarizer(self.llm_client)
+        self.message_writer = MessageWriter()
+        self.profile_cache = ProfileCache()
+        self.session_registry = SessionRegistry()
+        self.password_hasher = PasswordHasher()
+        # Per (username, client IP) and per client IP if enabled, so one client's burst queues behind itself
+        self.login_admission = KeyedAdmission(
+            "auth.admission", settings.LOGIN_MAX_ACTIVE_PER_CLIENT, settings.LOGIN_MAX_WAITING_PER_CLIENT
+        )
+        self.profile_scheduler = ProfileExtractionScheduler(self.llm_client, self.profile_cache, self.session_registry)
+
+        # Cached answers cite retrieved products, so they go stale with the catalog
+        self.response_cache = None
+        if settings.RESPONSE_CACHE_ENABLED:
+            self.response_cache = SemanticResponseCache(
+                "chat.response_cache",
+                settings.RESPONSE_CACHE_SIZE,
+                settings.RESPONSE_CACHE_TTL_SECONDS,
+                settings.RESPONSE_CACHE_SIMILARITY
+            )
+            on_catalog_changed(self.response_cache.clear)
+
+    async def start(self) -> None:
+        """Async warm-up that needs the event loop (seed embeddings go through the batcher)."""
+        self.message_writer.start()
+        self.profile_scheduler.start()
+        self.catalog_watcher.start()
+        await self.session_registry.start()
+        await self.password_hasher.calibrate()
+
+        if settings.INTENT_MEMO_PATH:
+            try:
+                loaded = self.intent_router.load_memo(settings.INTENT_MEMO_PATH)
+                logger.info(f"Intent memo warm start: {loaded} entries")
+            except Exception as e:
+                logger.warning(f"Could not load intent memo: {e}")
+
+        if settings.INTENT_LOCAL_CLASSIFIER_ENABLED:
+            classifier = EmbeddingIntentClassifier(
+                self.rag_service.embed, settings.INTENT_SEEDS_PATH, embed_seeds=self.rag_service.embed_many
+            )
+            # Until it loads the router keeps using the LLM fallback and retries the load
+            self.intent_router.local_classifier = classifier
+            await classifier.try_load()
+
+    async def aclose(self) -> None:
+        """Release pooled connections on shutdown."""
+        # Queued chat turns are committed before anything else goes away
+        await self.message_writer.aclose()
+        # Un-extracted turns stay behind the DB watermark and are picked up later
+        await self.profile_scheduler.aclose()
+        await self.session_registry.aclose()
+        await self.catalog_watcher.aclose()
+        if settings.INTENT_MEMO_PATH:
+            try:
+                saved = self.intent_router.save_memo(settings.INTENT_MEMO_PATH)
+                logger.info(f"Intent memo saved: {saved} entries")
+            except Exception as e:
+                logger.warning(f"Could not save intent memo: {e}")
+        await self.llm_http_client.aclose()
+        await self.search_http_client.aclose()
+        self.vector_executor.shutdown()
+        self.password_hasher.executor.shutdown()
+        logger.info("Service container closed.")
@@ -26,6 +26,18 @@ async_session_maker = async_sessionmaker(
 class Base(DeclarativeBase):
     pass
 
+# Columns added after the first release; create_all() does not alter existing
+# tables, so init_db adds any that are missing.
+ADDED_COLUMNS = {
+    "conversations": {
+        "summary": "VARCHAR",
+        "summarized_through": "DATETIME",
+    },
+    "user_profiles": {
+        "extracted_through": "DATETIME",
+    },
+}
+
 async def get_db() -> AsyncSession:
     async with async_session_maker() as session:
         yield session
@@ -36,6 +48,7 @@ async def init_db():
         async with engine.begin() as conn:
             # Create all tables
             await conn.run_sync(Base.metadata.create_all)
+            await _add_missing_columns(conn)
             
             # Enable WAL mode
             await conn.execute(sqlalchemy.text("PRAGMA journal_mode=WAL"))
@@ -45,5 +58,14 @@ async def init_db():
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
 
+async def _add_missing_columns(conn) -> None:
+    for table, columns in ADDED_COLUMNS.items():
+        result = await conn.execute(sqlalchemy.text(f"PRAGMA table_info({table})"))
+        existing = {row[1] for row in result}
+        for column, ddl in columns.items():
+            if column not in existing:
+                await conn.execute(sqlalchemy.text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                logger.info(f"Added column {table}.{column}")
+
 # Fix import for text
 import sqlalchemy
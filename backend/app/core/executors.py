@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+class ExecutorSaturated(Exception):
+    """Raised when a BoundedExecutor already has its maximum of running + queued jobs."""
+
+class BoundedExecutor:
+    """
+    Thread pool for blocking work (vector search, embedding, hashing) with a
+    bounded queue. Callers are rejected instead of piling up when the queue is
+    full, can time out while a job is queued or running, and every job reports
+    its queue wait and compute time separately under `<name>.*` metrics.
+    """
+
+    def __init__(self, name: str, max_workers: int, queue_depth: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.capacity = max_workers + queue_depth
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._inflight = 0
+
+    async def run(self, fn: Callable[..., T], *args, timeout: float | None = None, **kwargs) -> T:
+        """Run `fn` in the pool. Raises ExecutorSaturated or asyncio.TimeoutError."""
+        with self._lock:
+            if self._inflight >= self.capacity:
+                metrics.incr(f"{self.name}.rejected")
+                raise ExecutorSaturated(f"{self.name} executor is saturated ({self.capacity} jobs)")
+            self._inflight += 1
+            metrics.gauge(f"{self.name}.inflight", self._inflight)
+
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            metrics.observe(f"{self.name}.queue_wait_ms", (started - submitted) * 1000)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.observe(f"{self.name}.compute_ms", (time.perf_counter() - started) * 1000)
+
+        future = self._pool.submit(job)
+        # The slot is freed when the job really finishes (or is dropped from the
+        # queue), not when the caller stops waiting for it.
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            metrics.incr(f"{self.name}.timeouts")
+            # Nobody waits for it any more: drop it if it has not started
+            future.cancel()
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def set_queue_depth(self, queue_depth: int) -> None:
+        """Resize the queue; jobs already admitted are unaffected."""
+        self.capacity = self.max_workers + queue_depth
+        metrics.gauge(f"{self.name}.capacity", self.capacity)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._inflight -= 1
+            metrics.gauge(f"{self.name}.inflight", self._inflight)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
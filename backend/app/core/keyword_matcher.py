@@ -0,0 +1,92 @@
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick multi-pattern matcher. Built once from (term, label, weight)
+    entries; `find` scans the text in a single pass regardless of how many
+    terms the dictionary holds. Matching is case-insensitive (casefold), and a
+    term that starts or ends with a Latin letter/digit only matches on a word
+    boundary there ("mer" does not match inside "summer"; CJK terms match anywhere).
+    Instances are immutable after construction, so a reload builds a new one
+    and swaps the reference.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, float]]):
+        # Goto function as one dict per state; state 0 is the root
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Indexes into self.patterns ending at each state (including via fail links)
+        self._output: List[List[int]] = [[]]
+        self.patterns: List[Tuple[str, str, float]] = []
+
+        seen: Dict[Tuple[str, str], int] = {}
+        for term, label, weight in entries:
+            term = term.strip().casefold()
+            if not term:
+                continue
+            if (term, label) in seen:
+                # Same term listed twice for one label: keep the higher weight
+                index = seen[(term, label)]
+                if weight > self.patterns[index][2]:
+                    self.patterns[index] = (term, label, weight)
+                continue
+            seen[(term, label)] = len(self.patterns)
+            self._insert(term, len(self.patterns))
+            self.patterns.append((term, label, weight))
+        self._build_failure_links()
+
+    def _insert(self, term: str, pattern_index: int) -> None:
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern_index)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> List[Tuple[str, str, float]]:
+        """Every (term, label, weight) occurring in `text`, each pattern reported once."""
+        goto, fail, output = self._goto, self._fail, self._output
+        text = text.casefold()
+        state = 0
+        found = set()
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                if index not in found and self._on_boundary(text, end + 1 - len(self.patterns[index][0]), end + 1):
+                    found.add(index)
+        return [self.patterns[i] for i in sorted(found)]
+
+    @staticmethod
+    def _on_boundary(text: str, start: int, end: int) -> bool:
+        if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self.patterns)
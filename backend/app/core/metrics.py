@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+
+class _Summary:
+    """Count/sum/max plus a bounded window of recent samples for percentiles."""
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def as_dict(self) -> dict:
+        ordered = sorted(self.recent)
+        def pct(p: float) -> float:
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+        }
+
+class Metrics:
+    """
+    Process-local counters, gauges and timing summaries.
+    Thread-safe so executor threads can record into it; exposed at GET /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, _Summary] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = _Summary()
+            summary.add(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Record the wrapped block's wall time in milliseconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings_ms": {k: v.as_dict() for k, v in self._summaries.items()},
+            }
+
+class StageTimer:
+    """Per-request stage timings, mirrored into the global metrics under `prefix`."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def record(self, stage: str, elapsed_ms: float) -> None:
+        self.stages[stage] = round(elapsed_ms, 2)
+        metrics.observe(f"{self.prefix}.{stage}", elapsed_ms)
+
+    def mark(self, stage: str) -> None:
+        """Record the time elapsed since the request started (e.g. time to first token)."""
+        self.record(stage, (time.perf_counter() - self.start) * 1000)
+
+    @asynccontextmanager
+    async def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000)
+
+metrics = Metrics()
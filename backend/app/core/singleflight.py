@@ -0,0 +1,31 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+from app.core.metrics import metrics
+
+K = TypeVar("K", bound=Hashable)
+R = TypeVar("R")
+
+class SingleFlight(Generic[K, R]):
+    """
+    Request coalescing: concurrent `do` calls with the same key share one
+    in-flight call to `fn`. The call runs as its own task, so a caller that is
+    cancelled stops waiting without cancelling it for the others. Coalesced
+    callers are counted as `<name>.coalesced`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[K, asyncio.Task] = {}
+
+    async def do(self, key: K, fn: Callable[[], Awaitable[R]]) -> R:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            metrics.incr(f"{self.name}.coalesced")
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
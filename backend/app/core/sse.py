@@ -0,0 +1,58 @@
+import json
+import time
+from typing import AsyncIterator, List
+from app.core.metrics import metrics
+
+try:
+    # Optional: ~5-10x faster encoding of the many small frames (`pip install orjson`)
+    import orjson
+
+    def _dumps(data: dict) -> str:
+        return orjson.dumps(data).decode()
+except ImportError:
+    def _dumps(data: dict) -> str:
+        return json.dumps(data)
+
+def sse_frame(data: dict) -> str:
+    """One `data:` event; both encoders produce JSON the frontend parses identically."""
+    return f"data: {_dumps(data)}\n\n"
+
+async def coalesce_deltas(deltas: AsyncIterator[str], flush_ms: float, max_bytes: int) -> AsyncIterator[str]:
+    """
+    Merge text deltas so each yielded piece becomes one SSE frame: buffered
+    deltas are emitted once `flush_ms` has passed since the last frame or the
+    buffer reaches `max_bytes` (UTF-8), checked as each delta arrives. The very
+    first delta is emitted immediately so time-to-first-token is unchanged, and
+    whatever is buffered is emitted when upstream ends. `flush_ms <= 0` passes
+    every delta through unchanged (one frame per upstream chunk).
+
+    There is no timer: if upstream stalls, buffered text waits for the next
+    delta (LLM deltas arrive every few ms, well inside any useful `flush_ms`).
+    """
+    if flush_ms <= 0:
+        async for delta in deltas:
+            yield delta
+        return
+
+    interval = flush_ms / 1000
+    clock = time.monotonic
+    buffer: List[str] = []
+    size = 0
+    flushed_at = None
+    async for delta in deltas:
+        if flushed_at is None:
+            flushed_at = clock()
+            yield delta
+            continue
+        buffer.append(delta)
+        size += len(delta.encode())
+        if size >= max_bytes or clock() - flushed_at >= interval:
+            metrics.observe("sse.deltas_per_frame", len(buffer))
+            piece = "".join(buffer)
+            buffer.clear()
+            size = 0
+            flushed_at = clock()
+            yield piece
+    if buffer:
+        metrics.observe("sse.deltas_per_frame", len(buffer))
+        yield "".join(buffer)
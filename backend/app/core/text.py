@@ -0,0 +1,33 @@
+import unicodedata
+
+try:
+    # Optional: full traditional -> simplified conversion (`pip install opencc`)
+    from opencc import OpenCC
+    _t2s = OpenCC("t2s").convert
+except ImportError:
+    _t2s = None
+
+# Fallback traditional -> simplified table for characters common in skincare
+# questions and small talk; used when opencc is not installed.
+_T2S_PAIRS = (
+    "們们謝谢嗎吗這这個个麼么問问題题膚肤護护乾干買买價价錢钱適适類类麵面華华產产"
+    "膠胶濕湿潤润質质來来說说請请對对會会還还沒没兒儿時时為为應应該该讓让點点號号"
+    "開开關关見见裡里後后過过發发與与樣样種种長长臉脸紅红黃黄歲岁當当氣气雙双報报"
+    "導导聞闻趨趋勢势愛爱學学體体頭头髮发線线曬晒衛卫隨随於于從从總总實实際际處处"
+    "無无隻只幾几邊边電电話话網网紹绍錯错醫医藥药療疗務务業业夠够擇择經经驗验歡欢"
+    "樂乐嚴严損损傷伤試试選选購购蘭兰詩诗頓顿歐欧萊莱閣阁妳你謹谨懶懒煩烦悶闷"
+    "覺觉聽听讀读寫写親亲區区縮缩緊紧鬆松彈弹斕斓麗丽層层膩腻漬渍鹼碱"
+)
+_T2S_TABLE = str.maketrans(_T2S_PAIRS[0::2], _T2S_PAIRS[1::2])
+
+def to_simplified(text: str) -> str:
+    return _t2s(text) if _t2s else text.translate(_T2S_TABLE)
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form for memo keys: NFKC (full-width -> half-width), traditional ->
+    simplified, casefolded, with whitespace, punctuation and symbols removed.
+    "你好！", " 妳好 " and "你好~" all map to "你好".
+    """
+    text = to_simplified(unicodedata.normalize("NFKC", text)).casefold()
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] not in "PZSC")
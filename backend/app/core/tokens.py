@@ -0,0 +1,82 @@
+import logging
+import math
+import re
+import threading
+from typing import Dict, List
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Chat-format overhead per message (role + separators), as in OpenAI's accounting
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = "…"
+
+# CJK characters and full-width punctuation are ~1 token each; Latin words ~4
+# characters per token and digit runs ~3; any other symbol counts as one.
+_PIECES = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]|[A-Za-z]+|\d+|\S")
+
+def _load_encoding():
+    """Exact tokenizer when tiktoken (and its encoding file) is available, else None."""
+    if not settings.TOKENIZER_ENCODING:
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.info(f"Using heuristic token estimator ({e.__class__.__name__}: {e})")
+        return None
+
+# Loaded on first use in a background thread: tiktoken may fetch the encoding
+# file over the network (and hang offline), so counts use the heuristic until
+# it is ready, or for good if it fails.
+_encoding = None
+_encoding_requested = False
+_encoding_lock = threading.Lock()
+
+def _set_encoding() -> None:
+    global _encoding
+    _encoding = _load_encoding()
+
+def _get_encoding():
+    global _encoding_requested
+    if not _encoding_requested:
+        with _encoding_lock:
+            if not _encoding_requested:
+                _encoding_requested = True
+                threading.Thread(target=_set_encoding, name="tokenizer-loader", daemon=True).start()
+    return _encoding
+
+def _piece_cost(piece: str) -> int:
+    if piece[0].isascii() and piece[0].isalpha():
+        return math.ceil(len(piece) / 4)
+    if piece[0].isdigit():
+        return math.ceil(len(piece) / 3)
+    return 1
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(_piece_cost(m.group()) for m in _PIECES.finditer(text))
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` within `max_tokens` (marker included), or "" if nothing fits."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - 1  # room for the marker
+    if budget <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:budget]) + TRUNCATION_MARKER
+    used = 0
+    for match in _PIECES.finditer(text):
+        used += _piece_cost(match.group())
+        if used > budget:
+            return text[:match.start()].rstrip() + TRUNCATION_MARKER
+    return text
@@ -1,15 +1,296 @@
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple
 import chromadb
+import numpy as np
 from chromadb.config import Settings
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
 from app.core.config import settings
+from app.schemas.product import Product, ProductFilter
+
+logger = logging.getLogger(__name__)
 
 def get_chroma_client():
     """Get ChromaDB client."""
     return chromadb.PersistentClient(path=settings.CHROMA_PERSIST_DIRECTORY)
 
-def get_collection():
-    """Get or create the product collection."""
-    client = get_chroma_client()
+def get_embedding_function():
+    """MiniLM ONNX embedder used for both documents and queries."""
+    return DefaultEmbeddingFunction()
+
+def get_collection(client=None, embedding_function=None):
+    """Get or create the product collection (reusing `client` when given)."""
+    client = client or get_chroma_client()
     return client.get_or_create_collection(
         name=settings.CHROMA_COLLECTION_NAME,
-        metadata={"hnsw:space": "cosine"}
+        metadata={"hnsw:space": "cosine"},
+        embedding_function=embedding_function or get_embedding_function()
     )
+
+def filterable_metadata(product: Product) -> dict:
+    """
+    Flat boolean flags for the list fields so stores can filter on them
+    (Chroma metadata cannot filter on JSON-encoded lists). `brand` and
+    `price_range` are already scalar metadata.
+    """
+    flags = {f"skin:{s.value}": True for s in product.suitable_skin_types}
+    flags.update({f"efficacy:{e}": True for e in product.efficacy})
+    flags.update({f"risk:{r}": True for r in product.risk_ingredients})
+    return flags
+
+def chroma_where(product_filter: ProductFilter | None) -> dict | None:
+    """Translate a (catalog-resolved) ProductFilter into a Chroma `where` clause."""
+    if product_filter is None or product_filter.is_empty():
+        return None
+    clauses = []
+    if product_filter.skin_types:
+        clauses.append(_any_flag([f"skin:{s.value}" for s in product_filter.skin_types]))
+    if product_filter.price_ranges:
+        clauses.append({"price_range": {"$in": [p.value for p in product_filter.price_ranges]}})
+    for risk in product_filter.exclude_risk_ingredients:
+        clauses.append({f"risk:{risk}": {"$ne": True}})
+    if product_filter.brands:
+        clauses.append({"brand": {"$in": list(product_filter.brands)}})
+    if product_filter.efficacy:
+        clauses.append(_any_flag([f"efficacy:{e}" for e in product_filter.efficacy]))
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _any_flag(keys: List[str]) -> dict:
+    return {keys[0]: True} if len(keys) == 1 else {"$or": [{k: True} for k in keys]}
+
+class VectorHit(NamedTuple):
+    id: str
+    similarity: float  # cosine similarity, 1.0 = identical
+
+class VectorStore(ABC):
+    """Read side of the product vector index used by RAGService."""
+
+    @abstractmethod
+    def query(self, embeddings: Sequence, n_results: int, where: ProductFilter | None = None) -> List[List[VectorHit]]:
+        """Top-`n_results` eligible hits for each query embedding, best first. Blocking."""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def all_metadata(self) -> List[Tuple[str, dict]]:
+        """(id, metadata) for every indexed product; used to build the product store."""
+
+class ChromaVectorStore(VectorStore):
+    """Persistent HNSW index (the ingestion target and source of truth)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, embeddings: Sequence, n_results: int, where: ProductFilter | None = None) -> List[List[VectorHit]]:
+        # Ids and distances only: products are resolved from the in-memory product store
+        results = self.collection.query(
+            query_embeddings=list(embeddings),
+            n_results=n_results,
+            where=chroma_where(where),
+            include=["distances"]
+        )
+        # Cosine distance (we set "hnsw:space": "cosine"), so similarity = 1 - distance
+        return [
+            [VectorHit(id_, 1 - dist) for id_, dist in zip(ids, distances)]
+            for ids, distances in zip(results["ids"], results["distances"])
+        ]
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def all_metadata(self, page_size: int = 1000) -> List[Tuple[str, dict]]:
+        items = []
+        for offset in range(0, self.collection.count(), page_size):
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            items.extend(zip(page["ids"], page["metadatas"]))
+        return items
+
+class NumpyFlatIndex(VectorStore):
+    """
+    Exact brute-force cosine search over a contiguous, pre-normalized matrix
+    memory-mapped from the snapshot written by ingestion. At catalog sizes of a
+    few thousand products one matrix product beats HNSW + SQLite metadata lookups
+    and has no recall loss. float16 snapshots halve memory at some CPU cost.
+    A missing or unreadable snapshot is logged and served as an empty index
+    (every query below threshold) until a reload finds a valid one.
+    """
+
+    EMBEDDINGS_FILE = "embeddings.npy"
+    INDEX_FILE = "index.json"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._state = (np.zeros((0, 0), dtype=np.float32), [], [], {})
+        self.reload()
+
+    def reload(self) -> None:
+        """Re-open the snapshot; readers see either the old or the new index, never a mix."""
+        try:
+            matrix = np.load(os.path.join(self.directory, self.EMBEDDINGS_FILE), mmap_mode="r")
+            with open(os.path.join(self.directory, self.INDEX_FILE), encoding="utf-8") as f:
+                index = json.load(f)
+            if len(index["ids"]) != len(matrix):
+                raise ValueError(f"{len(index['ids'])} ids for {len(matrix)} vectors")
+        except Exception as e:
+            # Keep serving the previous (or empty) index
+            logger.error(f"NumPy index snapshot in {self.directory} unavailable, keeping {self.count()} vectors: {e}")
+            return
+        # The last element caches filter columns built lazily from the metadata flags
+        self._state = (matrix, index["ids"], index["metadatas"], {})
+
+    def query(self, embeddings: Sequence, n_results: int, where: ProductFilter | None = None) -> List[List[VectorHit]]:
+        matrix, ids, metadatas, columns = self._state
+        mask = self._mask(where, metadatas, columns)
+        eligible = len(ids) if mask is None else int(mask.sum())
+        if not eligible:
+            return [[] for _ in embeddings]
+
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True).clip(min=1e-12)
+        scores = (queries.astype(matrix.dtype) @ matrix.T).astype(np.float32)  # (n_queries, n_products)
+        if mask is not None:
+            # Ineligible products can never enter the top-k
+            scores[:, ~mask] = -np.inf
+
+        k = min(n_results, eligible)
+        if k < len(ids):
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(len(ids)), (len(queries), 1))
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        return [
+            [VectorHit(ids[j], float(scores[row, j])) for j in top[row]]
+            for row in range(len(queries))
+        ]
+
+    @staticmethod
+    def _mask(product_filter: ProductFilter | None, metadatas: List[dict], columns: Dict[str, np.ndarray]) -> np.ndarray | None:
+        if product_filter is None or product_filter.is_empty():
+            return None
+
+        def flag(key: str) -> np.ndarray:
+            if key not in columns:
+                columns[key] = np.fromiter((bool(m.get(key)) for m in metadatas), dtype=bool, count=len(metadatas))
+            return columns[key]
+
+        def value_in(key: str, values: List[str]) -> np.ndarray:
+            cache_key = f"{key} in {sorted(values)}"
+            if cache_key not in columns:
+                wanted = set(values)
+                columns[cache_key] = np.fromiter((m.get(key) in wanted for m in metadatas), dtype=bool, count=len(metadatas))
+            return columns[cache_key]
+
+        mask = np.ones(len(metadatas), dtype=bool)
+        if product_filter.skin_types:
+            mask &= np.logical_or.reduce([flag(f"skin:{s.value}") for s in product_filter.skin_types])
+        if product_filter.price_ranges:
+            mask &= value_in("price_range", [p.value for p in product_filter.price_ranges])
+        for risk in product_filter.exclude_risk_ingredients:
+            mask &= ~flag(f"risk:{risk}")
+        if product_filter.brands:
+            mask &= value_in("brand", product_filter.brands)
+        if product_filter.efficacy:
+            mask &= np.logical_or.reduce([flag(f"efficacy:{e}") for e in product_filter.efficacy])
+        return mask
+
+    def count(self) -> int:
+        return len(self._state[1])
+
+    def all_metadata(self) -> List[Tuple[str, dict]]:
+        _, ids, metadatas, _ = self._state
+        return list(zip(ids, metadatas))
+
+def export_numpy_snapshot(collection, directory: str | None = None, dtype: str | None = None) -> int:
+    """Write the collection as a normalized .npy matrix + id/metadata sidecar for NumpyFlatIndex."""
+    directory = directory or settings.NUMPY_INDEX_DIRECTORY
+    dtype = np.dtype(dtype or settings.NUMPY_INDEX_DTYPE)
+    os.makedirs(directory, exist_ok=True)
+
+    data = collection.get(include=["embeddings", "metadatas"])
+    matrix = np.asarray(data["embeddings"], dtype=np.float32).reshape(len(data["ids"]), -1)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+
+    # Write temp files and rename so a concurrent reload never sees a partial snapshot
+    embeddings_path = os.path.join(directory, NumpyFlatIndex.EMBEDDINGS_FILE)
+    index_path = os.path.join(directory, NumpyFlatIndex.INDEX_FILE)
+    with open(embeddings_path + ".tmp", "wb") as f:
+        np.save(f, np.ascontiguousarray(matrix.astype(dtype)))
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"ids": data["ids"], "metadatas": data["metadatas"]}, f, ensure_ascii=False)
+    os.replace(embeddings_path + ".tmp", embeddings_path)
+    os.replace(index_path + ".tmp", index_path)
+    return len(data["ids"])
+
+def get_vector_store(client=None, embedding_function=None) -> VectorStore:
+    """Vector backend selected by settings.VECTOR_BACKEND ("chroma" or "numpy")."""
+    if settings.VECTOR_BACKEND == "numpy":
+        store = NumpyFlatIndex(settings.NUMPY_INDEX_DIRECTORY)
+        on_catalog_changed(store.reload)
+        return store
+    return ChromaVectorStore(get_collection(client, embedding_function))
+
+# Listeners notified whenever ingestion changes the collection: directly when
+# ingestion runs in this process, via CatalogWatcher when it runs as the CLI
+_catalog_listeners: List[Callable[[], None]] = []
+
+def on_catalog_changed(callback: Callable[[], None]) -> None:
+    """Register a callback (e.g. a cache clear) to run after ingestion upserts."""
+    _catalog_listeners.append(callback)
+
+def notify_catalog_changed() -> None:
+    for callback in _catalog_listeners:
+        callback()
+
+def _manifest_mtime() -> float | None:
+    try:
+        return os.path.getmtime(settings.INGEST_MANIFEST_PATH)
+    except OSError:
+        return None
+
+class CatalogWatcher:
+    """
+    Picks up ingestion runs made by the CLI in another process: the ingestion
+    manifest (written after the upserts and the NumPy snapshot) is polled every
+    CATALOG_WATCH_SECONDS and the catalog listeners run when its mtime changes.
+    Listeners run on the event loop, since they swap shared caches; a reload
+    costs a few hundred ms once per ingestion.
+    """
+
+    def __init__(self):
+        # Taken before the stores load, so an ingestion finishing during startup is not missed
+        self._mtime = _manifest_mtime()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if settings.CATALOG_WATCH_SECONDS > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def check(self) -> bool:
+        """Run the listeners if the manifest changed since the last check."""
+        mtime = _manifest_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        logger.info("Ingestion manifest changed; reloading catalog")
+        notify_catalog_changed()
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.CATALOG_WATCH_SECONDS)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Catalog reload failed: {e}")
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,13 +1,28 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.database import init_db
+from app.core.container import ServiceContainer
+from app.core.metrics import metrics
 from app.api.endpoints import auth, chat
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    # Shared clients, pools and vector store handles live for the whole process
+    app.state.services = ServiceContainer()
+    await app.state.services.start()
+    try:
+        yield
+    finally:
+        await app.state.services.aclose()
+
 app = FastAPI(
     title="SkinTech AI Consultant",
     description="Intelligent Skincare Consultant API with RAG and Time-Awareness",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -19,10 +34,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
-async def startup_event():
-    await init_db()
-
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(chat.router, prefix="/api", tags=["chat"])
 
@@ -33,3 +44,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics")
+async def metrics_snapshot():
+    return metrics.snapshot()
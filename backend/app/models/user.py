@@ -30,6 +30,8 @@ class UserProfile(Base):
     concerns: Mapped[List[str]] = mapped_column(JSON, default=[])
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
     version: Mapped[int] = mapped_column(Integer, default=1)
+    # Newest message (of any of the user's conversations) already sent to profile extraction
+    extracted_through: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     user: Mapped["User"] = relationship("User", back_populates="profile")
 
@@ -39,6 +41,9 @@ class Conversation(Base):
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id: Mapped[str] = mapped_column(ForeignKey("users.id"), index=True, nullable=False)
     title: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Rolling summary of every message created up to and including `summarized_through`
+    summary: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    summarized_through: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -28,3 +28,23 @@ class ProductDocument(BaseModel):
     id: str
     text: str  # Formatted string for embedding
     metadata: dict  # Original product fields for retrieval
+
+class ProductFilter(BaseModel):
+    """Structured retrieval constraints (usually derived from the user profile). Empty lists mean "any"."""
+    skin_types: list[SkinType] = []
+    price_ranges: list[BudgetRange] = []
+    exclude_risk_ingredients: list[str] = []
+    brands: list[str] = []
+    efficacy: list[str] = []
+
+    def is_empty(self) -> bool:
+        return not (self.skin_types or self.price_ranges or self.exclude_risk_ingredients or self.brands or self.efficacy)
+
+    def cache_key(self) -> tuple:
+        return (
+            tuple(sorted(s.value for s in self.skin_types)),
+            tuple(sorted(p.value for p in self.price_ranges)),
+            tuple(sorted(self.exclude_risk_ingredients)),
+            tuple(sorted(self.brands)),
+            tuple(sorted(self.efficacy)),
+        )
@@ -1,10 +1,31 @@
+import logging
+import os
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 from jose import jwt
 from app.core.config import settings
+from app.core.executors import BoundedExecutor
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# min == max == default: hashes made with any other cost are flagged for rehash on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
+
+def create_password_executor() -> BoundedExecutor:
+    return BoundedExecutor(
+        "password_executor",
+        max_workers=settings.PASSWORD_HASH_WORKERS,
+        # Provisional until PasswordHasher.calibrate sizes an automatic queue
+        queue_depth=settings.PASSWORD_HASH_QUEUE_DEPTH or settings.PASSWORD_HASH_WORKERS,
+    )
 
 class AuthService:
     @staticmethod
@@ -26,3 +47,42 @@ class AuthService:
         to_encode.update({"exp": expire})
         encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
         return encoded_jwt
+
+class PasswordHasher:
+    """
+    bcrypt off the event loop: hashing and verification run on a dedicated
+    BoundedExecutor (bcrypt releases the GIL), so a login burst queues there
+    instead of stalling every in-flight chat stream. Raises ExecutorSaturated
+    when the queue is full and asyncio.TimeoutError after
+    PASSWORD_HASH_TIMEOUT_SECONDS. With PASSWORD_HASH_QUEUE_DEPTH=0 the queue
+    is sized by `calibrate` to what the pool drains in
+    PASSWORD_HASH_MAX_WAIT_SECONDS, so excess load fails fast with 429.
+    """
+
+    def __init__(self, executor: BoundedExecutor | None = None):
+        self.executor = executor or create_password_executor()
+
+    async def calibrate(self) -> int:
+        """Measure one hash and size the queue from pool throughput; returns the queue depth."""
+        if settings.PASSWORD_HASH_QUEUE_DEPTH > 0:
+            return settings.PASSWORD_HASH_QUEUE_DEPTH
+        started = time.perf_counter()
+        await self.executor.run(AuthService.get_password_hash, "calibration")
+        seconds = time.perf_counter() - started
+        # Workers beyond the core count add no throughput
+        parallel = min(self.executor.max_workers, os.cpu_count() or 1)
+        depth = max(1, int(settings.PASSWORD_HASH_MAX_WAIT_SECONDS * parallel / seconds))
+        self.executor.set_queue_depth(depth)
+        logger.info(f"Password hashing: {seconds * 1000:.0f} ms per hash, queue depth {depth}")
+        return depth
+
+    async def hash(self, password: str) -> str:
+        return await self.executor.run(
+            AuthService.get_password_hash, password, timeout=settings.PASSWORD_HASH_TIMEOUT_SECONDS
+        )
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, str | None]:
+        """(valid, new hash or None): a new hash is returned when the stored one uses an outdated cost."""
+        return await self.executor.run(
+            pwd_context.verify_and_update, password, hashed_password, timeout=settings.PASSWORD_HASH_TIMEOUT_SECONDS
+        )
@@ -1,154 +1,422 @@
-import json
-from typing import AsyncGenerator
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Hashable, List, Set, Tuple, TypeVar
+from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from openai import AsyncOpenAI
 
 from app.core.config import settings
-from app.models.user import User, Message, Conversation
+from app.core.container import ServiceContainer
+from app.core.metrics import StageTimer, metrics
+from app.core.sse import coalesce_deltas, sse_frame
+from app.core.tokens import count_tokens
+from app.models.user import User, UserProfile, Message, Conversation
 from app.schemas.chat import ChatRequest
-from app.services.intent_router import IntentRouter, IntentType
-from app.services.rag_service import RAGService
-from app.services.web_search_service import WebSearchService
-from app.services.context_assembler import ContextAssembler
-from app.services.profile_agent import ProfileExtractionAgent
+from app.schemas.product import Product
+from app.services.conversation_summarizer import unsummarized_filter
+from app.services.message_writer import MessageWriter
+from app.services.profile_cache import ProfileSnapshot
+from app.services.intent_router import IntentResult, IntentType
+from app.services.rag_service import RAGResult, profile_filter
+from app.services.web_search_service import SearchResult
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def utcnow() -> datetime:
+    """Naive UTC, matching the CURRENT_TIMESTAMP values SQLite's func.now() writes."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+TRUNCATED_MARKER = "\n\n[回复已中断]"
+
+# Running mean of completed reply lengths, used to estimate tokens saved by aborting
+_completion_tokens_avg = 0.0
+
+def record_completion_tokens(tokens: int) -> None:
+    global _completion_tokens_avg
+    _completion_tokens_avg += 0.05 * (tokens - _completion_tokens_avg)
+
+# Detached tasks must be referenced until they finish
+_background_tasks: Set[asyncio.Task] = set()
+
+def spawn_background(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+def record_llm_usage(usage) -> None:
+    """
+    Token usage of a completion, including provider prompt-cache hits when
+    reported: DeepSeek's `prompt_cache_hit_tokens` or OpenAI's
+    `prompt_tokens_details.cached_tokens`.
+    """
+    metrics.incr("llm.prompt_tokens", usage.prompt_tokens or 0)
+    metrics.incr("llm.completion_tokens", usage.completion_tokens or 0)
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details else None
+    if cached is not None:
+        metrics.incr("llm.prompt_cache_hit_tokens", cached)
+        metrics.observe("llm.prompt_cache_hit_ratio", cached / usage.prompt_tokens if usage.prompt_tokens else 0.0)
+
+class RetrievalContext(BaseModel):
+    """Output of the intent + retrieval stage."""
+    intent: IntentResult
+    rag_products: List[Product] = []
+    web_results: List[SearchResult] = []
+    sources: List[dict] = []
 
 class ChatService:
-    def __init__(self, db: AsyncSession):
+    """Per-request facade: the session is the only per-request state, everything else is shared."""
+
+    def __init__(self, db: AsyncSession, services: ServiceContainer):
         self.db = db
-        self.intent_router = IntentRouter()
-        self.rag_service = RAGService()
-        self.web_search_service = WebSearchService()
-        self.context_assembler = ContextAssembler()
-        self.profile_agent = ProfileExtractionAgent(db)
-        self.openai_client = AsyncOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_BASE_URL
-        ) if settings.OPENAI_API_KEY else None
-
-    async def chat(self, user: User, request: ChatRequest) -> AsyncGenerator[str, None]:
-        # 1. Get or Create Conversation
-        conversation_id = request.conversation_id
-        if not conversation_id:
-            # Create new conversation
-            new_conv = Conversation(user_id=user.id, title=request.message[:20])
-            self.db.add(new_conv)
-            await self.db.commit()
-            await self.db.refresh(new_conv)
-            conversation_id = new_conv.id
-        else:
-            # Verify ownership
-            result = await self.db.execute(select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == user.id))
-            if not result.scalar_one_or_none():
-                 yield self._sse_error("Conversation not found")
-                 return
+        self.intent_router = services.intent_router
+        self.rag_service = services.rag_service
+        self.web_search_service = services.web_search_service
+        self.context_assembler = services.context_assembler
+        self.openai_client = services.llm_client
+        self.response_cache = services.response_cache
+        self.summarizer = services.conversation_summarizer
+        self.profile_scheduler = services.profile_scheduler
+        self.profile_cache = services.profile_cache
+        self.message_writer = services.message_writer
 
-        # 2. Intent Classification
-        intent_result = await self.intent_router.classify(request.message)
-        
-        # 3. Retrieval (RAG / Web)
-        rag_products = []
-        web_results = []
-        sources = []
-
-        if intent_result.intent == IntentType.PRODUCT_KNOWLEDGE:
-            rag_result = await self.rag_service.retrieve(request.message)
-            rag_products = rag_result.products
-            
-            if rag_result.below_threshold:
-                # Fallback to web search if no good product match
-                web_results = await self.web_search_service.search(request.message)
-                sources.extend([{"type": "web", "title": r.title, "url": r.url} for r in web_results])
-            else:
-                 sources.extend([{"type": "product", "title": p.product_name, "url": None} for p in rag_products])
-                 
-        elif intent_result.intent == IntentType.EXTERNAL_KNOWLEDGE:
-            web_results = await self.web_search_service.search(request.message)
-            sources.extend([{"type": "web", "title": r.title, "url": r.url} for r in web_results])
-
-        # 4. Load History
-        history_result = await self.db.execute(
-            select(Message)
-            .where(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.asc())
-        )
-        chat_history = history_result.scalars().all()
+    async def chat(
+        self,
+        user: User,
+        request: ChatRequest,
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        SSE stream for one turn. `is_disconnected` (the endpoint's
+        `Request.is_disconnected`) is polled while the LLM streams; when the
+        client is gone the upstream generation is closed and the partial reply
+        is stored with TRUNCATED_MARKER.
+        """
+        timer = StageTimer("chat")
+        received_at = utcnow()
+
+        # 1-4. Staged pipeline: the DB stage (conversation, profile, history) and the
+        # intent/retrieval stage share no state, so they run concurrently. Only the
+        # DB stage touches the AsyncSession, which must not be used concurrently.
+        # Retrieval needs only the profile (for its filters), handed over as soon as it is loaded.
+        profile_ready = asyncio.get_running_loop().create_future()
+        db_task = asyncio.create_task(self._load_conversation(user, request, profile_ready, timer))
+        retrieval_task = asyncio.create_task(self._classify_and_retrieve(request.message, profile_ready, timer))
+        try:
+            conversation = await db_task
+            if conversation is None:
+                yield self._sse_error("Conversation not found")
+                return
+            retrieval = await retrieval_task
+        finally:
+            for task in (db_task, retrieval_task):
+                if not task.done():
+                    task.cancel()
+
+        conversation_id, user_profile, chat_history, summary = conversation
+        rag_products = retrieval.rag_products
+        web_results = retrieval.web_results
+        sources = retrieval.sources
 
         # 5. Assemble Prompt
-        messages = self.context_assembler.assemble(
+        prompt = self.context_assembler.assemble(
             current_query=request.message,
             rag_products=rag_products,
             web_results=web_results,
-            user_profile=user.profile,
-            chat_history=list(chat_history)
+            user_profile=user_profile,
+            chat_history=chat_history,
+            conversation_summary=summary
         )
+        messages = prompt.messages
 
-        # 6. Stream Response
+        # 6. Stream Response (or replay a cached answer to an equivalent question)
         full_response = ""
-        
-        if self.openai_client:
+        cache_bucket, query_embedding, cached_response = await self._lookup_cached_response(
+            request.message, retrieval, user_profile, chat_history
+        )
+
+        if cached_response is not None:
+            async with timer.stage("cache_replay"):
+                full_response = cached_response
+                step = settings.RESPONSE_CACHE_REPLAY_CHUNK_CHARS
+                for start in range(0, len(cached_response), step):
+                    yield self._sse_data({"content": cached_response[start:start + step]})
+            if sources:
+                yield self._sse_data({"sources": sources})
+        elif self.openai_client:
+            stream = None
+            abandoned = False
+            # Every delta taken from upstream, including any still buffered by
+            # coalesce_deltas when the client leaves; the abandoned reply is built from it
+            received: List[str] = []
             try:
                 stream = await self.openai_client.chat.completions.create(
                     model=settings.OPENAI_MODEL,
                     messages=messages,
                     stream=True,
-                    temperature=0.7
+                    temperature=0.7,
+                    **({"stream_options": {"include_usage": True}} if settings.LLM_STREAM_USAGE else {})
                 )
                 
-                async for chunk in stream:
-                    content = chunk.choices[0].delta.content
-                    if content:
+                async def deltas() -> AsyncIterator[str]:
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None):
+                            record_llm_usage(chunk.usage)
+                        if not chunk.choices:
+                            # The usage chunk carries no choices
+                            continue
+                        content = chunk.choices[0].delta.content
+                        if content:
+                            received.append(content)
+                            yield content
+
+                # One frame per upstream chunk, or deltas packed per SSE_FLUSH_INTERVAL_MS / SSE_FLUSH_MAX_BYTES
+                pieces = coalesce_deltas(deltas(), settings.SSE_FLUSH_INTERVAL_MS, settings.SSE_FLUSH_MAX_BYTES)
+                next_poll = time.monotonic() + settings.LLM_DISCONNECT_POLL_SECONDS
+                async with timer.stage("llm_stream"), aclosing(pieces):
+                    async for content in pieces:
+                        if not full_response:
+                            timer.mark("ttft")
                         full_response += content
                         yield self._sse_data({"content": content})
+
+                        # Cheap, throttled check: stop generating as soon as nobody is reading
+                        if is_disconnected is not None and time.monotonic() >= next_poll:
+                            next_poll = time.monotonic() + settings.LLM_DISCONNECT_POLL_SECONDS
+                            if await is_disconnected():
+                                abandoned = True
+                                return
                         
                 # Send sources at the end
                 if sources:
                     yield self._sse_data({"sources": sources})
+
+                if cache_bucket is not None and full_response:
+                    self.response_cache.store(cache_bucket, query_embedding, full_response)
+                record_completion_tokens(count_tokens(full_response))
                     
+            except (asyncio.CancelledError, GeneratorExit):
+                # Client went away mid-stream: the server cancelled us or closed the generator
+                abandoned = True
+                raise
             except Exception as e:
                 yield self._sse_error(f"LLM Error: {str(e)}")
                 return
+            finally:
+                if abandoned:
+                    # Nothing can be awaited reliably here (we may be cancelled), so the
+                    # upstream close and the partial-reply write run as a detached task.
+                    partial_response = "".join(received)
+                    spawn_background(self._abandon_stream(
+                        stream, self.message_writer, self._turn_messages(conversation_id, user.id, request.message, received_at, partial_response + TRUNCATED_MARKER, sources),
+                        partial_response
+                    ))
         else:
             # Mock response if no API key
             mock_resp = "I'm sorry, I cannot process your request because the OpenAI API key is missing."
             full_response = mock_resp
             yield self._sse_data({"content": mock_resp})
 
-        # 7. Save Messages to DB
-        # User Message
-        user_msg = Message(
-            conversation_id=conversation_id,
-            user_id=user.id,
-            role="user",
-            content=request.message
-        )
-        self.db.add(user_msg)
-        
-        # Assistant Message
-        assistant_msg = Message(
-            conversation_id=conversation_id,
-            user_id=user.id,
-            role="assistant",
-            content=full_response,
-            sources=sources
-        )
-        self.db.add(assistant_msg)
-        
-        await self.db.commit()
+        # 7. Save Messages to DB (batched with other turns by the message writer)
+        async with timer.stage("persist"):
+            await self.message_writer.write(
+                self._turn_messages(conversation_id, user.id, request.message, received_at, full_response, sources)
+            )
+
+        # Fold turns that left the recent window into the running summary (background)
+        if len(chat_history) + 2 - settings.CONTEXT_HISTORY_MESSAGES >= settings.SUMMARY_TRIGGER_MESSAGES:
+            self.summarizer.schedule(conversation_id)
+        # Debounced per user: most turns only bump a counter
+        self.profile_scheduler.note_turn(user.id)
         
         # Yield conversation ID to client if it was new
         yield self._sse_data({"conversation_id": conversation_id, "done": True})
+        timer.mark("total")
+        logger.info(
+            f"Chat stages (ms) intent={retrieval.intent.intent.value} prompt_v{prompt.prompt_version} "
+            f"prompt_tokens={prompt.prompt_tokens} "
+            f"trimmed={prompt.trimmed_segments}: {timer.stages}"
+        )
+
+    @staticmethod
+    def _turn_messages(
+        conversation_id: str, user_id: str, query: str, received_at: datetime, response: str, sources: List[dict]
+    ) -> List[Message]:
+        """The user message and the assistant reply of one turn."""
+        return [
+            Message(
+                conversation_id=conversation_id,
+                user_id=user_id,
+                role="user",
+                content=query,
+                # Explicit sub-second timestamps keep turn order (and the summary watermark) unambiguous
+                created_at=received_at
+            ),
+            Message(
+                conversation_id=conversation_id,
+                user_id=user_id,
+                role="assistant",
+                content=response,
+                sources=sources,
+                created_at=utcnow()
+            ),
+        ]
+
+    @staticmethod
+    async def _abandon_stream(stream, writer: MessageWriter, turn: List[Message], partial_response: str) -> None:
+        """Close the upstream completion and keep the partial reply (via the writer: the request's session is gone)."""
+        metrics.incr("llm.abandoned_streams")
+        generated = count_tokens(partial_response)
+        metrics.observe("llm.abandoned_completion_tokens", generated)
+        metrics.incr("llm.abandoned_tokens_saved_est", max(_completion_tokens_avg - generated, 0))
+        try:
+            if stream is not None:
+                # openai's AsyncStream.close() releases the HTTP response (and stops generation)
+                await stream.close()
+        except Exception as e:
+            logger.warning(f"Failed to close abandoned LLM stream: {e}")
+        try:
+            await writer.write(turn)
+        except Exception as e:
+            logger.warning(f"Failed to persist abandoned reply: {e}")
+
+    async def _lookup_cached_response(
+        self, query: str, retrieval: RetrievalContext, profile: ProfileSnapshot | None, chat_history: List[Message]
+    ) -> Tuple[Hashable | None, list | None, str | None]:
+        """
+        (bucket, query embedding, cached answer) for the semantic response cache.
+        Only first-turn, product-knowledge answers grounded purely in retrieved
+        products are cacheable; anything that depends on the conversation or on
+        web results bypasses the cache (bucket None).
+        """
+        if (
+            self.response_cache is None
+            or self.openai_client is None
+            or chat_history
+            or retrieval.intent.intent != IntentType.PRODUCT_KNOWLEDGE
+            or not retrieval.rag_products
+            or retrieval.web_results
+        ):
+            return None, None, None
+        try:
+            # Already computed (and cached) by retrieval
+            embedding = await self.rag_service.embed(query)
+        except Exception as e:
+            logger.warning(f"Response cache bypassed, embedding failed: {e}")
+            return None, None, None
+        bucket = self.response_cache.make_bucket([p.id for p in retrieval.rag_products], profile)
+        return bucket, embedding, self.response_cache.lookup(bucket, embedding)
+
+    async def _load_conversation(
+        self, user: User, request: ChatRequest, profile_ready: asyncio.Future, timer: StageTimer
+    ) -> Tuple[str, ProfileSnapshot | None, List[Message], str | None] | None:
+        """
+        DB stage: load the profile, then get/create the conversation, its summary
+        and its recent (unsummarized) history on the one session.
+        """
+        async with timer.stage("db"):
+            # Normally cached by get_current_user; a lazy `user.profile` load fails under asyncio
+            if user.id in self.profile_cache:
+                profile = self.profile_cache.get(user.id)
+            else:
+                profile = self.profile_cache.put(user.id, await self.db.get(UserProfile, user.id))
+            profile_ready.set_result(profile)
+
+            conversation_id = request.conversation_id
+            if not conversation_id:
+                # Create new conversation; it has no history yet
+                new_conv = Conversation(user_id=user.id, title=request.message[:20])
+                self.db.add(new_conv)
+                await self.db.commit()
+                await self.db.refresh(new_conv)
+                return new_conv.id, profile, [], None
+
+            # Verify ownership
+            result = await self.db.execute(select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == user.id))
+            conversation = result.scalar_one_or_none()
+            if not conversation:
+                return None
+
+            # Only the recent window is read; older turns are covered by the summary.
+            # The extra SUMMARY_TRIGGER_MESSAGES cover turns not yet folded in.
+            window = settings.CONTEXT_HISTORY_MESSAGES
+            if self.summarizer.enabled:
+                window += settings.SUMMARY_TRIGGER_MESSAGES
+            history_result = await self.db.execute(
+                select(Message)
+                .where(unsummarized_filter(conversation))
+                .order_by(Message.created_at.desc())
+                .limit(window)
+            )
+            history = list(reversed(history_result.scalars().all()))
+            return conversation_id, profile, history, conversation.summary
+
+    async def _classify_and_retrieve(self, query: str, profile_ready: asyncio.Future, timer: StageTimer) -> RetrievalContext:
+        """
+        Intent + retrieval stage. When the keyword layer is inconclusive the LLM
+        classifier and a speculative RAG lookup run side by side; the RAG result is
+        dropped if the query turns out not to be about products.
+        """
+        async with timer.stage("retrieval"):
+            intent_result = self.intent_router.keyword_classify(query) or self.intent_router.memo_lookup(query)
+            speculative_rag = None
+
+            if intent_result is None:
+                if self.intent_router.has_model_fallback:
+                    speculative_rag = asyncio.create_task(self._timed(timer, "rag", self._retrieve_products(query, profile_ready)))
+                try:
+                    intent_result = await self._timed(timer, "intent", self.intent_router.fallback_classify(query))
+                except BaseException:
+                    if speculative_rag:
+                        speculative_rag.cancel()
+                    raise
+
+            context = RetrievalContext(intent=intent_result)
+
+            if intent_result.intent == IntentType.PRODUCT_KNOWLEDGE:
+                if speculative_rag:
+                    metrics.incr("chat.speculative_rag.used")
+                    rag_result = await speculative_rag
+                else:
+                    rag_result = await self._timed(timer, "rag", self._retrieve_products(query, profile_ready))
+                context.rag_products = rag_result.products
+                # Sources list exactly the products placed in the prompt
+                context.sources.extend([{"type": "product", "title": p.product_name, "url": None} for p in context.rag_products])
+
+                if rag_result.below_threshold:
+                    # Fallback to web search if no good product match
+                    context.web_results = await self._timed(timer, "web", self.web_search_service.search(query))
+                    context.sources.extend([{"type": "web", "title": r.title, "url": r.url} for r in context.web_results])
+                return context
+
+            if speculative_rag:
+                metrics.incr("chat.speculative_rag.discarded")
+                speculative_rag.cancel()
+
+            if intent_result.intent == IntentType.EXTERNAL_KNOWLEDGE:
+                context.web_results = await self._timed(timer, "web", self.web_search_service.search(query))
+                context.sources.extend([{"type": "web", "title": r.title, "url": r.url} for r in context.web_results])
+            return context
+
+    async def _retrieve_products(self, query: str, profile_ready: asyncio.Future) -> RAGResult:
+        # Shield: cancelling one waiter must not cancel the shared future
+        profile = await asyncio.shield(profile_ready)
+        return await self.rag_service.retrieve(query, filters=profile_filter(profile))
 
-        # 8. Async Profile Extraction (Trigger every 5 messages or simplified trigger)
-        # For MVP, we can just trigger it. In production, use background tasks (FastAPI BackgroundTasks)
-        # to avoid blocking the response if not streaming, but here we are streaming.
-        # However, since this is a generator, we can't easily run background task after yield.
-        # We should accept BackgroundTasks in the API endpoint.
-        # For now, let's just do it here or better, inject it in the endpoint.
-        pass
+    @staticmethod
+    async def _timed(timer: StageTimer, stage: str, awaitable: Awaitable[T]) -> T:
+        async with timer.stage(stage):
+            return await awaitable
 
     def _sse_data(self, data: dict) -> str:
-        return f"data: {json.dumps(data)}\n\n"
+        return sse_frame(data)
 
     def _sse_error(self, message: str) -> str:
-        return f"data: {json.dumps({'error': message})}\n\n"
+        return sse_frame({"error": message})
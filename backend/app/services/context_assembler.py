@@ -1,9 +1,27 @@
 from datetime import datetime
 from typing import List, Dict, Any
-from app.models.user import UserProfile, Message
+from pydantic import BaseModel
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tokens import MESSAGE_OVERHEAD_TOKENS, count_message_tokens, count_tokens, truncate_to_tokens
+from app.models.user import Message
+from app.services.profile_cache import ProfileSnapshot
 from app.schemas.product import Product
 from app.services.web_search_service import SearchResult
 
+def rounded_now(granularity_minutes: int) -> datetime:
+    """Local time floored to the granularity, so the time block changes only that often."""
+    now = datetime.now().replace(second=0, microsecond=0)
+    minutes = now.hour * 60 + now.minute
+    minutes -= minutes % max(granularity_minutes, 1)
+    return now.replace(hour=minutes // 60, minute=minutes % 60)
+
+class AssembledPrompt(BaseModel):
+    messages: List[Dict[str, str]]
+    prompt_version: str
+    prompt_tokens: int  # estimated (exact when tiktoken is available)
+    trimmed_segments: int = 0  # items truncated or dropped to fit the budget
+
 class ContextAssembler:
     SYSTEM_PROMPT = """You are SkinTech AI Consultant, a professional cosmetic chemist and skincare formulator ("配方师").
 Your goal is to provide personalized, science-backed skincare advice.
@@ -20,23 +38,46 @@ Your goal is to provide personalized, science-backed skincare advice.
 3. Product Recommendations (if applicable): Use the retrieved products.
 4. Usage Advice: How to incorporate into routine.
 
-**Current Context:**
-{time_context}
+The current time, user profile and retrieved knowledge are provided in later system messages.
 """
+    # Bump whenever SYSTEM_PROMPT changes; it is the byte-identical prefix providers cache
+    PROMPT_VERSION = "2"
+    PRODUCTS_HEADER = "**Retrieved Product Knowledge:**"
+    WEB_HEADER = "**Web Search Results:**"
+    SUMMARY_HEADER = "**Earlier In This Conversation (summary):**"
+    USER_CONTEXT_HEADER = "User Context:"
+    TURN_HEADER = "**Current Context:**"
 
     def assemble(
         self,
         current_query: str,
         rag_products: List[Product] | None,
         web_results: List[SearchResult] | None,
-        user_profile: UserProfile | None,
+        user_profile: ProfileSnapshot | None,
         chat_history: List[Message],
-        max_tokens: int = 4096  # Approximation for context window management
-    ) -> List[Dict[str, str]]:
-        
-        # 1. System Prompt with Time
-        time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        system_content = self.SYSTEM_PROMPT.format(time_context=f"Current System Time: {time_str}")
+        max_tokens: int | None = None,
+        conversation_summary: str | None = None
+    ) -> AssembledPrompt:
+        """
+        Build the prompt within `max_tokens` (default CONTEXT_MAX_TOKENS).
+
+        The layout puts the most stable parts first so consecutive requests share
+        the longest possible prefix for provider-side prompt caching: the static
+        SYSTEM_PROMPT (identical for everyone), user context (profile + summary;
+        stable within a conversation), history turns, then the per-turn block
+        (rounded time + retrieved knowledge) and the query. The token budget is
+        filled by priority: system prompt, profile, conversation summary and
+        current query are always kept (an oversized query is truncated), then
+        products in retrieval order, recent turns newest first and web snippets
+        last, so older turns and long snippets are the first to be truncated or
+        dropped. `chat_history` is the caller's recent window, oldest first.
+        """
+        budget = max_tokens or settings.CONTEXT_MAX_TOKENS
+        trimmed = 0
+
+        # 1. Time, rounded so it does not change on every request
+        time_str = rounded_now(settings.PROMPT_TIME_GRANULARITY_MINUTES).strftime("%Y-%m-%d %H:%M")
+        time_context = f"{self.TURN_HEADER}\n- Current Time: {time_str}\n"
         
         # 2. User Profile Context
         profile_str = ""
@@ -49,38 +90,82 @@ Your goal is to provide personalized, science-backed skincare advice.
 - Budget: {user_profile.budget_range or 'Unknown'}
 """
 
-        # 3. RAG / Web Context
+        # Rolling summary of the turns before the recent window
+        if conversation_summary:
+            summary = truncate_to_tokens(conversation_summary, settings.SUMMARY_MAX_TOKENS)
+            profile_str += f"\n{self.SUMMARY_HEADER}\n{summary}\n"
+
+        # The system prompt, user context, time and query are always sent
+        remaining = budget - (
+            count_tokens(self.SYSTEM_PROMPT) + count_tokens(f"{self.USER_CONTEXT_HEADER}{profile_str}")
+            + count_tokens(time_context) + 4 * MESSAGE_OVERHEAD_TOKENS
+        )
+
+        # 3. Current Query (a pasted ingredient list must not crowd out everything else)
+        query_budget = max(min(settings.CONTEXT_QUERY_MAX_TOKENS, remaining), settings.CONTEXT_MIN_SEGMENT_TOKENS)
+        query = truncate_to_tokens(current_query, query_budget)
+        trimmed += query != current_query
+        remaining -= count_tokens(query)
+
+        # 4. RAG products, best first, whole lines only
+        product_lines = []
+        for p in rag_products or []:
+            line = f"- {p.product_name} ({p.brand}): {', '.join(p.core_ingredients)}. Good for {', '.join([s.value for s in p.suitable_skin_types])}."
+            cost = count_tokens(line) + (count_tokens(self.PRODUCTS_HEADER) if not product_lines else 0)
+            if cost > remaining:
+                trimmed += 1
+                continue
+            product_lines.append(line)
+            remaining -= cost
+
+        # 5. Chat History (short-term memory), newest first so older turns are cut first
+        history = []
+        for msg in reversed(chat_history):
+            content = truncate_to_tokens(msg.content, min(settings.CONTEXT_MESSAGE_MAX_TOKENS, remaining - MESSAGE_OVERHEAD_TOKENS))
+            if content != msg.content:
+                trimmed += 1
+            if count_tokens(content) < min(settings.CONTEXT_MIN_SEGMENT_TOKENS, count_tokens(msg.content)):
+                break
+            history.append({"role": msg.role, "content": content})
+            remaining -= count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        history.reverse()
+
+        # 6. Web snippets, each capped, while budget remains
+        web_lines = []
+        for r in web_results or []:
+            prefix = f"- {r.title} ({r.url}): "
+            overhead = count_tokens(prefix) + (count_tokens(self.WEB_HEADER) if not web_lines else 0)
+            snippet = truncate_to_tokens(r.snippet, min(settings.CONTEXT_SNIPPET_MAX_TOKENS, remaining - overhead))
+            if snippet != r.snippet:
+                trimmed += 1
+            if not snippet and r.snippet:
+                break
+            web_lines.append(prefix + snippet)
+            remaining -= overhead + count_tokens(snippet)
+
         knowledge_str = ""
-        if rag_products:
-            products_text = "\n".join([
-                f"- {p.product_name} ({p.brand}): {', '.join(p.core_ingredients)}. Good for {', '.join([s.value for s in p.suitable_skin_types])}."
-                for p in rag_products
-            ])
-            knowledge_str += f"\n**Retrieved Product Knowledge:**\n{products_text}\n"
-            
-        if web_results:
-            web_text = "\n".join([
-                f"- {r.title} ({r.url}): {r.snippet}" 
-                for r in web_results
-            ])
-            knowledge_str += f"\n**Web Search Results:**\n{web_text}\n"
-
-        # 4. Construct Messages
-        messages = [{"role": "system", "content": system_content}]
-        
-        # Inject Context into System or First Message
-        context_block = f"{profile_str}\n{knowledge_str}"
-        if context_block.strip():
-            messages.append({"role": "system", "content": f"Context Information:{context_block}"})
-
-        # 5. Chat History (Short Term Memory) - Limit to last 10
-        # Simple token management: just take last 10 for now. 
-        # For strict token budgeting, we would count tokens and truncate.
-        recent_history = chat_history[-10:]
-        for msg in recent_history:
-            messages.append({"role": msg.role, "content": msg.content})
-            
-        # 6. Current Query
-        messages.append({"role": "user", "content": current_query})
-        
-        return messages
+        if product_lines:
+            products_text = "\n".join(product_lines)
+            knowledge_str += f"\n{self.PRODUCTS_HEADER}\n{products_text}\n"
+        if web_lines:
+            web_text = "\n".join(web_lines)
+            knowledge_str += f"\n{self.WEB_HEADER}\n{web_text}\n"
+
+        # 7. Construct Messages: static prefix -> per-conversation -> history -> per-turn
+        messages = [{"role": "system", "content": self.SYSTEM_PROMPT}]
+        if profile_str.strip():
+            messages.append({"role": "system", "content": f"{self.USER_CONTEXT_HEADER}{profile_str}"})
+        messages.extend(history)
+        messages.append({"role": "system", "content": f"{time_context}{knowledge_str}"})
+        messages.append({"role": "user", "content": query})
+
+        prompt_tokens = count_message_tokens(messages)
+        metrics.observe("context.prompt_tokens", prompt_tokens)
+        if trimmed:
+            metrics.incr("context.trimmed_segments", trimmed)
+        return AssembledPrompt(
+            messages=messages,
+            prompt_version=self.PROMPT_VERSION,
+            prompt_tokens=prompt_tokens,
+            trimmed_segments=trimmed
+        )
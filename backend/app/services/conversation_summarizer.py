@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from typing import List, Set
+from openai import AsyncOpenAI
+from sqlalchemy import func, select, update
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.metrics import metrics
+from app.core.tokens import truncate_to_tokens
+from app.models.user import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """你负责维护一段护肤咨询对话的滚动摘要。请将"已有摘要"与"新增对话"合并成一份新的摘要：
+- 保留用户的肤质、过敏/敏感成分、护肤目标、预算、已推荐或已否定的产品及原因；
+- 去掉寒暄和重复内容，不要编造；
+- 使用与对话相同的语言，控制在 {max_tokens} 个 token 以内。
+仅输出摘要正文。"""
+
+def unsummarized_filter(conversation: Conversation):
+    """WHERE clause selecting the conversation's messages not yet folded into its summary."""
+    clause = Message.conversation_id == conversation.id
+    if conversation.summarized_through is not None:
+        clause = clause & (Message.created_at > conversation.summarized_through)
+    return clause
+
+class ConversationSummarizer:
+    """
+    Folds messages that have left the recent window (the last
+    CONTEXT_HISTORY_MESSAGES) into `Conversation.summary`, in the background,
+    once SUMMARY_TRIGGER_MESSAGES of them have piled up. Runs with its own
+    session; at most one run per conversation at a time. The watermark update
+    is conditional on the previous watermark, so a concurrent run on another
+    worker cannot fold the same messages twice.
+    """
+
+    def __init__(self, client: AsyncOpenAI | None):
+        self.client = client
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SUMMARY_ENABLED and self.client is not None
+
+    def schedule(self, conversation_id: str) -> None:
+        if not self.enabled or conversation_id in self._running:
+            return
+        self._running.add(conversation_id)
+        task = asyncio.create_task(self._run(conversation_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, conversation_id: str) -> None:
+        try:
+            async with async_session_maker() as session:
+                await self.summarize(session, conversation_id)
+        except Exception as e:
+            metrics.incr("summary.failures")
+            logger.warning(f"Conversation summary failed for {conversation_id}: {e}")
+        finally:
+            self._running.discard(conversation_id)
+
+    async def summarize(self, session, conversation_id: str) -> bool:
+        """Fold the oldest unsummarized messages into the summary. Returns True if it was updated."""
+        conversation = await session.get(Conversation, conversation_id)
+        if conversation is None:
+            return False
+
+        pending = await session.scalar(select(func.count()).select_from(Message).where(unsummarized_filter(conversation)))
+        foldable = min(pending - settings.CONTEXT_HISTORY_MESSAGES, settings.SUMMARY_MAX_BATCH)
+        if foldable < settings.SUMMARY_TRIGGER_MESSAGES:
+            return False
+
+        # One extra row marks the boundary; messages sharing its timestamp stay
+        # unsummarized so the `created_at >` watermark never splits a tie.
+        result = await session.execute(
+            select(Message)
+            .where(unsummarized_filter(conversation))
+            .order_by(Message.created_at.asc())
+            .limit(foldable + 1)
+        )
+        rows = list(result.scalars().all())
+        boundary = rows[-1].created_at
+        to_fold = [m for m in rows[:-1] if m.created_at < boundary]
+        if not to_fold:
+            return False
+
+        summary = await self._generate(conversation.summary, to_fold)
+        updated = await session.execute(
+            update(Conversation)
+            .where(
+                Conversation.id == conversation.id,
+                Conversation.summarized_through.is_(None) if conversation.summarized_through is None
+                else Conversation.summarized_through == conversation.summarized_through
+            )
+            .values(summary=summary, summarized_through=to_fold[-1].created_at)
+        )
+        await session.commit()
+        if updated.rowcount:
+            metrics.incr("summary.updates")
+            metrics.observe("summary.folded_messages", len(to_fold))
+        return bool(updated.rowcount)
+
+    async def _generate(self, previous: str | None, messages: List[Message]) -> str:
+        history_text = "\n".join(f"{m.role}: {m.content}" for m in messages)
+        response = await self.client.chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT.format(max_tokens=settings.SUMMARY_MAX_TOKENS)},
+                {"role": "user", "content": f"已有摘要:\n{previous or '（无）'}\n\n新增对话:\n{history_text}"}
+            ],
+            temperature=0,
+            max_tokens=settings.SUMMARY_MAX_TOKENS
+        )
+        return truncate_to_tokens(response.choices[0].message.content.strip(), settings.SUMMARY_MAX_TOKENS)
@@ -1,14 +1,67 @@
+import argparse
+import hashlib
 import json
+import os
+import time
 import uuid
 import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from faker import Faker
+from app.core.config import settings
 from app.schemas.product import Product, SkinType, BudgetRange
-from app.core.vector_db import get_collection
-from typing import List
+from app.core.vector_db import get_collection, get_embedding_function, export_numpy_snapshot, filterable_metadata, notify_catalog_changed
+from typing import Dict, Iterator, List
 import asyncio
 
 fake = Faker("zh_CN")
 
+# Per-process embedder for the ingestion process pool (loaded once per worker)
+_worker_embedder = None
+
+def _init_embedding_worker() -> None:
+    global _worker_embedder
+    _worker_embedder = get_embedding_function()
+
+def _embed_documents(documents: List[str]) -> list:
+    return [list(map(float, vector)) for vector in _worker_embedder(documents)]
+
+def iter_product_file(filepath: str, chunk_size: int = 1 << 16) -> Iterator[Product]:
+    """Stream products from a JSONL file or a JSON array without loading the whole file."""
+    with open(filepath, "r", encoding="utf-8") as f:
+        if filepath.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield Product.model_validate_json(line)
+            return
+
+        # JSON array: decode one element at a time from a sliding buffer
+        decoder = json.JSONDecoder()
+        buffer = ""
+        started = False
+        eof = False
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if not started and buffer.startswith("["):
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    if buffer.strip():
+                        raise
+                    return
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield Product.model_validate(item)
+            buffer = buffer[end:]
+
 class IngestionService:
     # 真实品牌列表
     BRANDS = [
@@ -119,23 +172,48 @@ class IngestionService:
         with open(filepath, "w", encoding="utf-8") as f:
             json.dump([p.model_dump() for p in products], f, ensure_ascii=False, indent=2)
 
+    def to_metadata(self, product: Product) -> dict:
+        """Product as Chroma metadata."""
+        # ChromaDB metadata values must be str, int, float, bool. Not list.
+        # We need to serialize lists to strings.
+        meta = product.model_dump(mode='json')
+        for key, value in meta.items():
+            if isinstance(value, list):
+                meta[key] = json.dumps(value, ensure_ascii=False)
+        # Filterable flags for skin type / efficacy / risk ingredients
+        meta.update(filterable_metadata(product))
+        return meta
+
+    @staticmethod
+    def content_hash(document: str) -> str:
+        return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+    def load_manifest(self) -> Dict[str, str]:
+        """product id -> content hash of the text last embedded for it."""
+        try:
+            with open(settings.INGEST_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)["products"]
+        except FileNotFoundError:
+            return {}
+
+    def save_manifest(self, hashes: Dict[str, str], stats: dict) -> None:
+        os.makedirs(os.path.dirname(settings.INGEST_MANIFEST_PATH) or ".", exist_ok=True)
+        tmp_path = settings.INGEST_MANIFEST_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "stats": stats,
+                "products": hashes
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, settings.INGEST_MANIFEST_PATH)
+
     async def ingest(self, products: List[Product]) -> int:
         """Vectorize products and upsert to ChromaDB."""
         collection = get_collection()
         
         ids = [p.id for p in products]
         documents = [self.format_for_embedding(p) for p in products]
-        
-        # ChromaDB metadata values must be str, int, float, bool. Not list.
-        # We need to serialize lists to strings.
-        metadatas = []
-        for p in products:
-            meta = p.model_dump(mode='json')
-            # Convert list fields to strings
-            for key, value in meta.items():
-                if isinstance(value, list):
-                    meta[key] = json.dumps(value, ensure_ascii=False)
-            metadatas.append(meta)
+        metadatas = [self.to_metadata(p) for p in products]
         
         batch_size = 100
         for i in range(0, len(products), batch_size):
@@ -146,10 +224,129 @@ class IngestionService:
                 metadatas=metadatas[i:end]
             )
             print(f"Ingested batch {i} to {end}")
-            
+
+        # Snapshot for the NumPy flat-index backend (VECTOR_BACKEND="numpy")
+        exported = export_numpy_snapshot(collection)
+        print(f"Exported {exported} vectors to {settings.NUMPY_INDEX_DIRECTORY}")
+
+        # Record what was embedded so incremental runs can skip these products
+        hashes = self.load_manifest()
+        hashes.update({pid: self.content_hash(doc) for pid, doc in zip(ids, documents)})
+        self.save_manifest(hashes, {"mode": "full", "upserted": len(products)})
+
+        notify_catalog_changed()
         return len(products)
 
+    async def ingest_file(
+        self,
+        filepath: str,
+        batch_size: int = 256,
+        workers: int | None = None,
+        full: bool = False,
+        allow_mass_delete: bool = False
+    ) -> dict:
+        """
+        Incremental ingestion from a JSON/JSONL file. Products whose embedding text
+        hash matches the manifest are skipped (unless `full`), indexed products
+        missing from the file are deleted in both modes (refused for an empty file
+        or more than INGEST_MAX_DELETE_FRACTION of the catalog unless
+        `allow_mass_delete`), and changed ones are embedded in a process pool and bulk-upserted
+        with precomputed embeddings while later batches are still being embedded.
+        """
+        start = time.perf_counter()
+        collection = get_collection()
+        # Deletions come from what is actually indexed, not the manifest
+        existing = set(collection.get(include=[])["ids"])
+        # An empty collection means the manifest no longer describes it
+        previous = {} if full or not existing else self.load_manifest()
+        hashes: Dict[str, str] = {}
+        stats = {"mode": "full" if full else "incremental", "seen": 0, "unchanged": 0, "upserted": 0, "deleted": 0}
+
+        loop = asyncio.get_running_loop()
+        workers = workers or settings.INGEST_WORKERS or os.cpu_count() or 1
+        pending = []
+
+        def flush(batch: List[Product]) -> None:
+            documents = [self.format_for_embedding(p) for p in batch]
+            future = loop.run_in_executor(pool, _embed_documents, documents)
+            pending.append((batch, documents, future))
+
+        async def drain(limit: int) -> None:
+            # Upsert finished batches in order, keeping at most `limit` in flight
+            while len(pending) > limit:
+                batch, documents, future = pending.pop(0)
+                embeddings = await future
+                collection.upsert(
+                    ids=[p.id for p in batch],
+                    embeddings=embeddings,
+                    documents=documents,
+                    metadatas=[self.to_metadata(p) for p in batch]
+                )
+                stats["upserted"] += len(batch)
+                print(f"Upserted {stats['upserted']} changed products ({stats['seen']} scanned)")
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_embedding_worker) as pool:
+            batch: List[Product] = []
+            for product in iter_product_file(filepath):
+                stats["seen"] += 1
+                digest = self.content_hash(self.format_for_embedding(product))
+                hashes[product.id] = digest
+                if previous.get(product.id) == digest:
+                    stats["unchanged"] += 1
+                    continue
+                batch.append(product)
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+                    await drain(workers * 2)
+            if batch:
+                flush(batch)
+            await drain(0)
+
+        removed = [pid for pid in existing if pid not in hashes]
+        if removed and not allow_mass_delete and (
+            not hashes or len(removed) > settings.INGEST_MAX_DELETE_FRACTION * len(existing)
+        ):
+            # Most likely an empty or truncated input file; keep the products (and their manifest entries)
+            print(
+                f"Refusing to delete {len(removed)} of {len(existing)} indexed products "
+                f"({stats['seen']} in {filepath}); pass --allow-mass-delete if this is intended"
+            )
+            stats["deletions_refused"] = len(removed)
+            hashes.update({pid: previous[pid] for pid in removed if pid in previous})
+            removed = []
+        for i in range(0, len(removed), batch_size):
+            collection.delete(ids=removed[i:i + batch_size])
+        stats["deleted"] = len(removed)
+
+        if stats["upserted"] or stats["deleted"] or full:
+            export_numpy_snapshot(collection)
+            notify_catalog_changed()
+
+        elapsed = time.perf_counter() - start
+        stats["elapsed_seconds"] = round(elapsed, 2)
+        stats["products_per_second"] = round(stats["seen"] / elapsed, 1) if elapsed else 0.0
+        self.save_manifest(hashes, stats)
+        return stats
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate demo products or ingest a product file.")
+    parser.add_argument("--file", help="JSON or JSONL product file to ingest incrementally")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-embed everything")
+    parser.add_argument("--workers", type=int, default=None, help="embedding processes")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument(
+        "--allow-mass-delete", action="store_true",
+        help="delete products missing from the file even if that empties most of the catalog"
+    )
+    args = parser.parse_args()
+
+    async def ingest_file():
+        stats = await IngestionService().ingest_file(
+            args.file, args.batch_size, args.workers, args.full, args.allow_mass_delete
+        )
+        print(f"完成: {json.dumps(stats, ensure_ascii=False)}")
+
     async def main():
         service = IngestionService()
         print("正在生成增强版美妆数据...")
@@ -163,4 +360,4 @@ if __name__ == "__main__":
         count = await service.ingest(products)
         print(f"成功存入 {count} 个产品到知识库。")
         
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(ingest_file() if args.file else main())
\ No newline at end of file
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.intent_router import IntentResult, IntentType
+
+logger = logging.getLogger(__name__)
+
+# Candidate softmax temperatures; the one with the lowest leave-one-out log loss
+# on the seed set is used, so confidences are roughly calibrated probabilities.
+TEMPERATURES = [0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2]
+
+class EmbeddingIntentClassifier:
+    """
+    Local intent classifier built on the product embedding model: the query is
+    compared to one centroid per intent (mean of the labelled seed examples),
+    and the cosine similarities are turned into a temperature-calibrated
+    softmax. Costs one (usually cached, batched) query embedding instead of an
+    LLM round trip. Seeds are embedded with `embed_seeds` (one call, no
+    per-query timeout) when given; a failed load is retried by `ensure_loading`
+    at most every INTENT_LOCAL_CLASSIFIER_RETRY_SECONDS.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Awaitable[list]],
+        seeds_path: str,
+        embed_seeds: Callable[[List[str]], Awaitable[list]] | None = None
+    ):
+        self.embed = embed
+        self.embed_seeds = embed_seeds
+        self.seeds_path = seeds_path
+        self.intents: List[IntentType] = []
+        self.centroids: np.ndarray | None = None
+        self.temperature = 0.05
+        self._loading: asyncio.Task | None = None
+        self._retry_at = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    async def load(self) -> None:
+        """Embed the seed file and fit centroids + temperature."""
+        with open(self.seeds_path, "r", encoding="utf-8") as f:
+            seeds: Dict[str, List[str]] = json.load(f)
+
+        examples = [(IntentType(intent), text) for intent, texts in seeds.items() for text in texts]
+        if self.embed_seeds is not None:
+            vectors = await self.embed_seeds([text for _, text in examples])
+        else:
+            vectors = await asyncio.gather(*(self.embed(text) for _, text in examples))
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        labels = np.array([intent.value for intent, _ in examples])
+
+        self.intents = [IntentType(value) for value in dict.fromkeys(labels.tolist())]
+        sums = np.stack([matrix[labels == intent.value].sum(axis=0) for intent in self.intents])
+        counts = np.array([(labels == intent.value).sum() for intent in self.intents], dtype=np.float32)
+        self.temperature = self._fit_temperature(matrix, labels, sums, counts)
+        self.centroids = _normalize(sums / counts[:, None])
+        logger.info(
+            f"Local intent classifier ready: {len(examples)} seeds, "
+            f"{len(self.intents)} intents, temperature={self.temperature}"
+        )
+
+    async def try_load(self) -> bool:
+        """`load`, logging a failure and scheduling the next retry instead of raising."""
+        try:
+            await self.load()
+            return True
+        except Exception as e:
+            self._retry_at = time.monotonic() + settings.INTENT_LOCAL_CLASSIFIER_RETRY_SECONDS
+            metrics.incr("intent.local_load_failures")
+            logger.warning(f"Local intent classifier unavailable, retrying later: {e}")
+            return False
+
+    def ensure_loading(self) -> None:
+        """Start a background load unless ready, already loading or still backing off."""
+        if self.ready or (self._loading and not self._loading.done()) or time.monotonic() < self._retry_at:
+            return
+        self._loading = asyncio.create_task(self.try_load())
+
+    def _fit_temperature(self, matrix: np.ndarray, labels: np.ndarray, sums: np.ndarray, counts: np.ndarray) -> float:
+        # Leave-one-out similarities: each seed against centroids that exclude itself
+        loo_sims = np.empty((len(matrix), len(self.intents)), dtype=np.float32)
+        targets = np.empty(len(matrix), dtype=int)
+        for i, (vector, label) in enumerate(zip(matrix, labels)):
+            own = self.intents.index(IntentType(label))
+            targets[i] = own
+            adjusted = sums.copy()
+            adjusted[own] -= vector
+            adjusted /= np.maximum(counts - (np.arange(len(counts)) == own), 1)[:, None]
+            loo_sims[i] = _normalize(adjusted) @ vector
+
+        def log_loss(temperature: float) -> float:
+            probs = _softmax(loo_sims / temperature)
+            return float(-np.log(probs[np.arange(len(targets)), targets] + 1e-9).mean())
+
+        return min(TEMPERATURES, key=log_loss)
+
+    async def classify(self, query: str) -> IntentResult:
+        vector = _normalize(np.asarray([await self.embed(query)], dtype=np.float32))[0]
+        probs = _softmax((self.centroids @ vector) / self.temperature)
+        best = int(np.argmax(probs))
+        return IntentResult(intent=self.intents[best], confidence=float(probs[best]), used_llm_fallback=False)
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True).clip(min=1e-12)
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
@@ -0,0 +1,104 @@
+import glob
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from app.core.config import settings
+from app.core.keyword_matcher import KeywordAutomaton
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Label given to terms taken from the ingested catalog
+CATALOG_LABEL = "product_knowledge"
+
+# Catalog values look like "Estee Lauder (雅诗兰黛)" or "视黄醇 (Retinol/A醇)";
+# whitespace is not a separator so multi-word names stay whole.
+_NAME_SPLIT = re.compile(r"[()（）/,，、]+")
+# Latin names too generic to signal a product question on their own
+_GENERIC_NAMES = {"acid", "vitamin", "extract", "cream", "serum", "water", "skin", "care", "the", "oil"}
+
+def catalog_names(value: str) -> List[str]:
+    """Whole brand / ingredient / efficacy names; short or generic Latin names are dropped."""
+    names = []
+    for name in (part.strip().casefold() for part in _NAME_SPLIT.split(value)):
+        if name.isascii():
+            if len(name) >= 4 and name not in _GENERIC_NAMES:
+                names.append(name)
+        elif len(name) >= 2:
+            names.append(name)
+    return names
+
+def read_dictionary(path: str) -> List[Tuple[str, float]]:
+    """Parse a `term<TAB>weight` file; blank lines and `#` comments are skipped."""
+    terms = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            term, _, weight = line.partition("\t")
+            try:
+                terms.append((term.strip(), float(weight) if weight.strip() else 1.0))
+            except ValueError:
+                logger.warning(f"Ignoring malformed keyword line in {path}: {line!r}")
+    return terms
+
+class IntentKeywordDictionary:
+    """
+    Weighted intent keywords compiled into one Aho-Corasick automaton: one
+    `<intent>.txt` file per intent in `directory`, plus the full brand,
+    ingredient and efficacy names of the catalog (when a product store is given).
+    Edited files are picked up by an mtime check at most every
+    INTENT_KEYWORDS_RELOAD_SECONDS; catalog changes trigger `reload` directly.
+    The new automaton is swapped in with one assignment.
+    """
+
+    def __init__(self, directory: str, product_store=None):
+        self.directory = directory
+        self.product_store = product_store
+        self._mtimes: Dict[str, float] = {}
+        self._checked_at = 0.0
+        self.reload()
+
+    def reload(self) -> None:
+        entries = []
+        mtimes = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.txt"))):
+            label = os.path.splitext(os.path.basename(path))[0]
+            mtimes[path] = os.path.getmtime(path)
+            entries.extend((term, label, weight) for term, weight in read_dictionary(path))
+
+        if self.product_store is not None:
+            for product in self.product_store.all():
+                for value in [product.brand, *product.core_ingredients, *product.efficacy, *product.risk_ingredients]:
+                    entries.extend((name, CATALOG_LABEL, settings.INTENT_CATALOG_TERM_WEIGHT) for name in catalog_names(value))
+
+        self._automaton = KeywordAutomaton(entries)
+        self._mtimes = mtimes
+        self._checked_at = time.monotonic()
+        metrics.gauge("intent.keyword_terms", len(self._automaton))
+        logger.info(f"Intent keyword automaton built: {len(self._automaton)} terms")
+
+    def maybe_reload(self) -> None:
+        """Rebuild if a dictionary file was added, removed or modified since the last build."""
+        now = time.monotonic()
+        if now - self._checked_at < settings.INTENT_KEYWORDS_RELOAD_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            paths = glob.glob(os.path.join(self.directory, "*.txt"))
+            if set(paths) != set(self._mtimes) or any(os.path.getmtime(p) != self._mtimes[p] for p in paths):
+                self.reload()
+        except OSError as e:
+            # Keep serving the previous automaton; the next check retries
+            logger.warning(f"Intent keyword reload failed: {e}")
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """Summed weight of the distinct terms found in `query`, per intent label."""
+        totals: Dict[str, float] = defaultdict(float)
+        for _, label, weight in self._automaton.find(query):
+            totals[label] += weight
+        return totals
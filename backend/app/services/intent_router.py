@@ -1,7 +1,18 @@
+import json
+import logging
+import os
+import time
 from enum import Enum
 from pydantic import BaseModel
 from openai import AsyncOpenAI
 from app.core.config import settings
+from app.core.clients import create_llm_client
+from app.core.cache import TTLCache
+from app.core.metrics import metrics
+from app.core.text import normalize_text
+from app.services.intent_keywords import IntentKeywordDictionary
+
+logger = logging.getLogger(__name__)
 
 class IntentType(str, Enum):
     PRODUCT_KNOWLEDGE = "product_knowledge"
@@ -15,28 +26,49 @@ class IntentResult(BaseModel):
 
 class IntentRouter:
     CONFIDENCE_THRESHOLD = 0.6
-    
-    # Keyword patterns
-    PRODUCT_KEYWORDS = ["推荐", "成分", "护肤品", "面霜", "精华", "乳液", "防晒", "美白", "抗老", "祛痘", "洗面奶", "水杨酸", "A醇", "玻尿酸"]
-    EXTERNAL_KEYWORDS = ["最新", "2025", "新品", "趋势", "新闻", "发布", "天气", "价格", "哪里买"]
 
-    def __init__(self):
-        self.client = AsyncOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_BASE_URL
-        ) if settings.OPENAI_API_KEY else None
+    def __init__(
+        self,
+        client: AsyncOpenAI | None = None,
+        local_classifier=None,
+        keywords: IntentKeywordDictionary | None = None
+    ):
+        self.client = client or create_llm_client()
+        # Weighted keyword automaton (dictionary files + catalog terms)
+        self.keywords = keywords or IntentKeywordDictionary(settings.INTENT_KEYWORDS_DIRECTORY)
+        # Optional EmbeddingIntentClassifier consulted before the LLM
+        self.local_classifier = local_classifier
+        # Fallback decisions keyed by normalize_text(query); "你好！" and "妳好" share an entry
+        self.memo: TTLCache[str, IntentResult] = TTLCache(
+            "intent.memo", settings.INTENT_MEMO_SIZE, settings.INTENT_MEMO_TTL_SECONDS
+        )
+
+    @property
+    def has_model_fallback(self) -> bool:
+        """True when an undecided query goes to the local classifier or the LLM, not a blind default."""
+        return self.client is not None or self._local_ready
+
+    @property
+    def _local_ready(self) -> bool:
+        return self.local_classifier is not None and self.local_classifier.ready
 
     async def classify(self, query: str) -> IntentResult:
         """
-        Two-layer intent classification:
+        Layered intent classification:
         1. Keyword matching with confidence scoring
-        2. LLM fallback if confidence < threshold
+        2. Local embedding classifier if confidence < threshold
+        3. LLM fallback only if the local result is ambiguous
         """
-        # Layer 1: Keyword Matching
-        product_score = sum(1 for k in self.PRODUCT_KEYWORDS if k in query)
-        external_score = sum(1 for k in self.EXTERNAL_KEYWORDS if k in query)
-        
-        total_len = len(query)
+        return self.keyword_classify(query) or self.memo_lookup(query) or await self.fallback_classify(query)
+
+    def keyword_classify(self, query: str) -> IntentResult | None:
+        """Layer 1: keyword matching. Returns None when confidence is below threshold."""
+        self.keywords.maybe_reload()
+        scores = self.keywords.scores(query)
+        product_score = scores.get(IntentType.PRODUCT_KNOWLEDGE.value, 0.0)
+        external_score = scores.get(IntentType.EXTERNAL_KNOWLEDGE.value, 0.0)
+        chat_score = scores.get(IntentType.GENERAL_CHAT.value, 0.0)
+
         # Normalize score (simple heuristic)
         confidence = 0.0
         intent = IntentType.GENERAL_CHAT
@@ -47,18 +79,87 @@ class IntentRouter:
         elif product_score > 0:
             intent = IntentType.PRODUCT_KNOWLEDGE
             confidence = 0.7 + (0.1 * product_score)
+        elif chat_score > 0:
+            confidence = 0.6 + (0.1 * chat_score)
         else:
             # Default to general chat with low confidence if no keywords found
             confidence = 0.4
 
         if confidence >= self.CONFIDENCE_THRESHOLD:
             return IntentResult(intent=intent, confidence=min(confidence, 1.0), used_llm_fallback=False)
-        
-        # Layer 2: LLM Fallback
+        return None
+
+    def memo_lookup(self, query: str) -> IntentResult | None:
+        """A previous fallback decision for the same normalized query, if still fresh."""
+        key = normalize_text(query)
+        return self.memo.get(key) if key else None
+
+    async def fallback_classify(self, query: str) -> IntentResult:
+        """Layers 2-3 for queries the keyword layer could not decide; model results are memoized."""
+        result = await self._fallback_classify(query)
+        if result is None:
+            # No classifier or LLM answered: a blind default, not a decision worth remembering
+            return IntentResult(intent=IntentType.GENERAL_CHAT, confidence=0.5, used_llm_fallback=False)
+        key = normalize_text(query)
+        # confidence 0.0 marks a failed LLM call; let the next request retry it
+        if key and result.confidence > 0.0:
+            self.memo.set(key, result)
+        return result
+
+    async def _fallback_classify(self, query: str) -> IntentResult | None:
+        local_result = None
+        if self.local_classifier is not None and not self.local_classifier.ready:
+            # Startup load failed (e.g. cold model); retried in the background
+            self.local_classifier.ensure_loading()
+        if self._local_ready:
+            try:
+                local_result = await self.local_classifier.classify(query)
+            except Exception as e:
+                logger.warning(f"Local intent classification failed: {e}")
+            if local_result and local_result.confidence >= settings.INTENT_LOCAL_MIN_CONFIDENCE:
+                metrics.incr("intent.local_decided")
+                return local_result
+
         if self.client:
+            metrics.incr("intent.llm_calls")
             return await self._llm_classify(query)
+
+        if local_result:
+            # No LLM to break the tie; the local guess still beats a blind default
+            return local_result
         
-        return IntentResult(intent=IntentType.GENERAL_CHAT, confidence=0.5, used_llm_fallback=False)
+        return None
+
+    def save_memo(self, path: str) -> int:
+        """Write live memo entries with their absolute expiry so another worker can warm-start."""
+        now = time.time()
+        entries = [
+            {"key": key, "result": result.model_dump(mode="json"), "expires_at": now + remaining}
+            for key, result, remaining in self.memo.items()
+        ]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        return len(entries)
+
+    def load_memo(self, path: str) -> int:
+        """Load a file written by `save_memo`, skipping expired entries. Missing file is not an error."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        now = time.time()
+        loaded = 0
+        for entry in entries:
+            remaining = entry["expires_at"] - now
+            if remaining > 0:
+                self.memo.set(entry["key"], IntentResult.model_validate(entry["result"]), ttl_seconds=remaining)
+                loaded += 1
+        metrics.gauge("intent.memo.warm_start_entries", loaded)
+        return loaded
 
     async def _llm_classify(self, query: str) -> IntentResult:
         try:
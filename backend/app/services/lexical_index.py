@@ -0,0 +1,103 @@
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from app.core.keyword_matcher import KeywordAutomaton
+from app.core.metrics import metrics
+from app.schemas.product import Product, ProductFilter
+from app.services.product_store import ProductStore
+
+# Per-field term weights (BM25F-style): an ingredient match says more than a name token
+FIELD_WEIGHTS = {
+    "core_ingredients": 3.0,
+    "efficacy": 2.0,
+    "brand": 2.0,
+    "product_name": 1.0,
+}
+
+_SPLIT = re.compile(r"[()（）/,，、\s]+")
+
+def extract_terms(value: str) -> List[str]:
+    """'视黄醇 (Retinol/A醇)' -> ['视黄醇', 'retinol', 'a醇']; single characters are dropped."""
+    return [t for t in (part.strip().casefold() for part in _SPLIT.split(value)) if len(t) >= 2]
+
+def product_matches(product: Product, product_filter: ProductFilter | None) -> bool:
+    """Python-side equivalent of the vector stores' filtering, for lexical candidates."""
+    if product_filter is None or product_filter.is_empty():
+        return True
+    f = product_filter
+    if f.skin_types and not set(f.skin_types) & set(product.suitable_skin_types):
+        return False
+    if f.price_ranges and product.price_range not in f.price_ranges:
+        return False
+    if f.exclude_risk_ingredients and set(f.exclude_risk_ingredients) & set(product.risk_ingredients):
+        return False
+    if f.brands and product.brand not in f.brands:
+        return False
+    if f.efficacy and not set(f.efficacy) & set(product.efficacy):
+        return False
+    return True
+
+class LexicalIndex:
+    """
+    In-process BM25 index over ingredient, efficacy, brand and name terms.
+    Exact ingredient names (水杨酸, A醇, 烟酰胺) are matched literally, which the
+    MiniLM embedding handles poorly for Chinese. Query terms are found with an
+    Aho-Corasick automaton over the catalog vocabulary, so no tokenizer is needed.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, product_store: ProductStore):
+        self.product_store = product_store
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        lengths: Dict[str, float] = {}
+        for product in self.product_store.all():
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                value = getattr(product, field)
+                for item in (value if isinstance(value, list) else [value]):
+                    for term in extract_terms(item):
+                        postings[term][product.id] = postings[term].get(product.id, 0.0) + weight
+                        length += weight
+            lengths[product.id] = length
+
+        n_docs = len(lengths)
+        avg_length = sum(lengths.values()) / n_docs if n_docs else 0.0
+        idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+        # One pass over the query finds every vocabulary term it contains; overlapping
+        # terms all count ("视黄醇" also matches "黄醇" when both are in the catalog)
+        automaton = KeywordAutomaton((term, "lexical", 1.0) for term in postings)
+        self._state = (dict(postings), lengths, avg_length, idf, automaton)
+        metrics.gauge("lexical_index.terms", len(postings))
+
+    def match_terms(self, query: str) -> List[str]:
+        return [term for term, _, _ in self._state[4].find(query)]
+
+    def search(self, query: str, top_k: int, product_filter: ProductFilter | None = None) -> List[Tuple[str, float]]:
+        """BM25 scores of products sharing at least one term with the query, best first."""
+        postings, lengths, avg_length, idf, _ = self._state
+        scores: Dict[str, float] = defaultdict(float)
+        for term in self.match_terms(query):
+            for product_id, tf in postings[term].items():
+                norm = self.K1 * (1 - self.B + self.B * lengths[product_id] / avg_length)
+                scores[product_id] += idf[term] * tf * (self.K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if product_filter is None or product_filter.is_empty():
+            return ranked[:top_k]
+        results = []
+        for product_id, score in ranked:
+            product = self.product_store.get(product_id)
+            if product is not None and product_matches(product, product_filter):
+                results.append((product_id, score))
+                if len(results) == top_k:
+                    break
+        return results
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import List, Tuple
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.metrics import metrics
+from app.models.user import Message
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+_Turn = Tuple[List[Message], asyncio.Future | None]
+
+class MessageWriter:
+    """
+    Write-behind message persistence. `write` hands a turn's messages to a
+    single writer task, which gathers everything queued within
+    MESSAGE_WRITER_BATCH_MS (up to MESSAGE_WRITER_MAX_BATCH turns, from any
+    conversation) into one transaction, so SQLite's write lock is taken once
+    per batch instead of once per chat turn. With MESSAGE_WRITE_ACK="commit"
+    `write` returns once the batch is committed; with "enqueue" it returns
+    immediately and a crash can lose the last few milliseconds of turns.
+    Messages carry explicit `created_at`, so batching never reorders history.
+    `aclose` flushes everything queued before returning.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=settings.MESSAGE_WRITER_MAX_QUEUE)
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, messages: List[Message]) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            # Not running (scripts, or after shutdown): write through
+            future = loop.create_future()
+            await self._commit([(messages, future)])
+            return await future
+        future = loop.create_future() if settings.MESSAGE_WRITE_ACK == "commit" else None
+        # Blocks only when MESSAGE_WRITER_MAX_QUEUE turns are already waiting (backpressure)
+        await self._queue.put((messages, future))
+        metrics.gauge("message_writer.queue_depth", self._queue.qsize())
+        if future is not None:
+            await future
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            if settings.MESSAGE_WRITER_BATCH_MS > 0:
+                await asyncio.sleep(settings.MESSAGE_WRITER_BATCH_MS / 1000)
+
+            batch, stop = [item], False
+            while len(batch) < settings.MESSAGE_WRITER_MAX_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            metrics.gauge("message_writer.queue_depth", self._queue.qsize())
+
+            await self._commit(batch)
+            if stop:
+                return
+
+    async def _commit(self, batch: List[_Turn]) -> None:
+        """One transaction for the whole batch; outcome goes to the waiting callers, never raised."""
+        messages = [m for turn, _ in batch for m in turn]
+        error = None
+        for attempt in range(settings.MESSAGE_WRITER_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(0.05 * attempt)
+            try:
+                with metrics.timer("message_writer.commit_ms"):
+                    async with async_session_maker() as session:
+                        session.add_all(messages)
+                        await session.commit()
+                error = None
+                break
+            except Exception as e:
+                error = e
+                metrics.incr("message_writer.failures")
+
+        if error is not None and len(batch) > 1:
+            # Don't let one bad turn take the rest of the batch with it
+            logger.warning(f"Message batch of {len(batch)} turns failed ({error}); committing turns one by one")
+            for turn in batch:
+                await self._commit([turn])
+            return
+
+        if error is not None:
+            metrics.incr("message_writer.dropped_messages", len(messages))
+            logger.error(f"Failed to persist {len(messages)} messages: {error}")
+        else:
+            metrics.observe("message_writer.batch_turns", len(batch))
+            metrics.observe("message_writer.batch_messages", len(messages))
+        for _, future in batch:
+            if future is not None and not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
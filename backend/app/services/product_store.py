@@ -0,0 +1,92 @@
+import json
+import logging
+import re
+from typing import Dict, Iterable, List, Set
+from app.core.metrics import metrics
+from app.core.vector_db import VectorStore
+from app.schemas.product import Product, ProductFilter
+
+logger = logging.getLogger(__name__)
+
+def decode_product_metadata(metadata: dict) -> Product:
+    """Rebuild a Product from vector-store metadata (list fields are stored as JSON strings)."""
+    meta = metadata.copy()
+    for key, value in meta.items():
+        if isinstance(value, str) and (value.startswith("[") and value.endswith("]")):
+            try:
+                meta[key] = json.loads(value)
+            except json.JSONDecodeError:
+                pass
+    return Product.model_validate(meta)
+
+class ProductStore:
+    """
+    Validated Product objects keyed by id, decoded once from the vector store's
+    metadata. Retrieval only returns ids and scores and resolves them here.
+    `reload` builds a complete new mapping and swaps it in one assignment, so
+    readers never observe a half-loaded catalog.
+    """
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+        self._products: Dict[str, Product] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        products = {}
+        for product_id, metadata in self.store.all_metadata():
+            try:
+                products[product_id] = decode_product_metadata(metadata)
+            except Exception as e:
+                logger.warning(f"Error parsing product metadata: {e}")
+        vocabulary = {
+            "brand": {p.brand for p in products.values()},
+            "efficacy": {e for p in products.values() for e in p.efficacy},
+            "risk_ingredients": {r for p in products.values() for r in p.risk_ingredients},
+        }
+        self._products, self._vocabulary = products, vocabulary
+        metrics.gauge("product_store.size", len(products))
+
+    def resolve_filter(self, product_filter: ProductFilter) -> ProductFilter:
+        """
+        Map free-text profile terms ("酒精", "CeraVe") onto the exact catalog values
+        the index is flagged with ("酒精 (Alcohol)", "CeraVe (适乐肤)"). A term
+        matches a value when it equals the whole value or one of its bracketed /
+        slash-separated names, case- and whitespace-insensitively. Brand and
+        efficacy constraints that match nothing in the catalog are dropped rather
+        than filtering out every product.
+        """
+        return product_filter.model_copy(update={
+            "exclude_risk_ingredients": _match_terms(product_filter.exclude_risk_ingredients, self._vocabulary["risk_ingredients"]),
+            "brands": _match_terms(product_filter.brands, self._vocabulary["brand"]),
+            "efficacy": _match_terms(product_filter.efficacy, self._vocabulary["efficacy"]),
+        })
+
+    def get(self, product_id: str) -> Product | None:
+        return self._products.get(product_id)
+
+    def resolve(self, product_ids: Iterable[str]) -> List[Product]:
+        products = self._products
+        return [products[i] for i in product_ids if i in products]
+
+    def all(self) -> List[Product]:
+        return list(self._products.values())
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+# "视黄醇 (Retinol/A醇)" -> 视黄醇, Retinol, A醇; whitespace is kept so "La Mer" stays one name
+_NAME_SPLIT = re.compile(r"[()（）/,，、]+")
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+def _value_names(value: str) -> Set[str]:
+    names = {_normalize(part) for part in _NAME_SPLIT.split(value)}
+    names.add(_normalize(value))
+    names.discard("")
+    return names
+
+def _match_terms(terms: List[str], vocabulary: Set[str]) -> List[str]:
+    wanted = {_normalize(t) for t in terms if t}
+    return sorted(value for value in vocabulary if wanted & _value_names(value))
@@ -1,24 +1,40 @@
+import asyncio
 import json
+import random
+from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from openai import AsyncOpenAI
 from app.core.config import settings
+from app.core.clients import create_llm_client
+from app.core.metrics import metrics
 from app.models.user import UserProfile, Message, User
+from app.services.profile_cache import ProfileCache
+from app.services.session_registry import SessionRegistry
 
 class ProfileExtractionAgent:
-    def __init__(self, db: AsyncSession):
+    def __init__(
+        self,
+        db: AsyncSession,
+        client: AsyncOpenAI | None = None,
+        profile_cache: ProfileCache | None = None,
+        session_registry: SessionRegistry | None = None
+    ):
         self.db = db
-        self.client = AsyncOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_BASE_URL
-        ) if settings.OPENAI_API_KEY else None
+        self.client = client or create_llm_client()
+        self.profile_cache = profile_cache
+        self.session_registry = session_registry
 
-    async def extract_and_update(self, user_id: str, chat_history: list[Message]) -> None:
+    async def extract_and_update(
+        self, user_id: str, chat_history: list[Message], extracted_through: datetime | None = None
+    ) -> bool:
         """
-        Analyze conversation history and update user profile.
+        Analyze conversation history and update user profile. `extracted_through`
+        advances the profile's extraction watermark in the same commit.
         """
         if not self.client or not chat_history:
-            return
+            return False
 
         # Prepare context for LLM
         history_text = "\n".join([f"{msg.role}: {msg.content}" for msg in chat_history[-20:]]) # Analyze last 20 messages
@@ -53,44 +69,73 @@ Example Output:
             )
             
             extracted_data = json.loads(response.choices[0].message.content)
-            await self._update_profile_in_db(user_id, extracted_data)
+            await self._update_profile_in_db(user_id, extracted_data, extracted_through)
+            return True
             
         except Exception as e:
             print(f"Profile extraction failed: {e}")
+            return False
 
-    async def _update_profile_in_db(self, user_id: str, data: dict) -> None:
-        """Atomically update user profile."""
-        # Check if profile exists
-        result = await self.db.execute(select(UserProfile).where(UserProfile.user_id == user_id))
-        profile = result.scalar_one_or_none()
-        
-        if not profile:
-            profile = UserProfile(user_id=user_id)
-            self.db.add(profile)
-        
-        # Merge data (simple overwrite for now, but could be smarter)
-        if data.get("skin_type"):
-            profile.skin_type = data["skin_type"]
-        
-        if data.get("budget_range"):
-            profile.budget_range = data["budget_range"]
-            
-        # For lists, we might want to append unique values instead of overwrite
-        # But for simplicity in this MVP, let's merge unique items
-        if data.get("sensitivities"):
-            current = set(profile.sensitivities or [])
-            current.update(data["sensitivities"])
-            profile.sensitivities = list(current)
-            
-        if data.get("preferred_brands"):
-            current = set(profile.preferred_brands or [])
-            current.update(data["preferred_brands"])
-            profile.preferred_brands = list(current)
-            
-        if data.get("concerns"):
-            current = set(profile.concerns or [])
-            current.update(data["concerns"])
-            profile.concerns = list(current)
-            
-        profile.version += 1
-        await self.db.commit()
+    async def _update_profile_in_db(self, user_id: str, data: dict, extracted_through: datetime | None = None) -> None:
+        """
+        Merge `data` into the profile as a compare-and-swap on `version`
+        (UPDATE ... WHERE version = <version read>). When another writer got
+        there first the row is re-read and the merge retried after a short
+        jittered backoff, so colliding writers do not collide again in lockstep.
+        """
+        for attempt in range(settings.PROFILE_UPDATE_MAX_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, 0.05 * attempt))
+            profile = await self.db.scalar(
+                select(UserProfile)
+                .where(UserProfile.user_id == user_id)
+                .execution_options(populate_existing=True)
+            )
+            values = self._merge(profile, data, extracted_through)
+
+            if profile is None:
+                profile = UserProfile(user_id=user_id, version=1, **values)
+                self.db.add(profile)
+                try:
+                    await self.db.commit()
+                except IntegrityError:
+                    # Created concurrently; merge into that row instead
+                    await self.db.rollback()
+                    metrics.incr("profile.update_conflicts")
+                    continue
+            else:
+                result = await self.db.execute(
+                    update(UserProfile)
+                    .where(UserProfile.user_id == user_id, UserProfile.version == profile.version)
+                    .values(version=profile.version + 1, **values)
+                )
+                if not result.rowcount:
+                    await self.db.rollback()
+                    metrics.incr("profile.update_conflicts")
+                    continue
+                await self.db.commit()
+
+            if self.profile_cache is not None:
+                self.profile_cache.put(user_id, profile)
+            if self.session_registry is not None:
+                # Cached principals carry the old profile snapshot
+                self.session_registry.invalidate_user(user_id)
+            return
+        raise RuntimeError(f"profile update for {user_id} still conflicting after {settings.PROFILE_UPDATE_MAX_RETRIES} retries")
+
+    @staticmethod
+    def _merge(profile: UserProfile | None, data: dict, extracted_through: datetime | None) -> dict:
+        """Column values to write: extracted scalars overwrite, list fields gain new unique items."""
+        values = {}
+        for field in ("skin_type", "budget_range"):
+            if data.get(field):
+                values[field] = data[field]
+        for field in ("sensitivities", "preferred_brands", "concerns"):
+            if data.get(field):
+                current = getattr(profile, field, None) or []
+                values[field] = list(dict.fromkeys([*current, *data[field]]))
+        if extracted_through is not None:
+            previous = profile.extracted_through if profile is not None else None
+            # Never move the watermark backwards
+            values["extracted_through"] = max(previous, extracted_through) if previous else extracted_through
+        return values
@@ -0,0 +1,61 @@
+from typing import List, Tuple
+from pydantic import BaseModel
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.user import UserProfile
+
+class ProfileSnapshot(BaseModel):
+    """Read-only copy of a UserProfile row; safe to share across requests and sessions."""
+    user_id: str
+    skin_type: str | None = None
+    sensitivities: List[str] = []
+    preferred_brands: List[str] = []
+    budget_range: str | None = None
+    concerns: List[str] = []
+    version: int = 0
+
+    @classmethod
+    def from_row(cls, profile: UserProfile) -> "ProfileSnapshot":
+        return cls(
+            user_id=profile.user_id,
+            skin_type=profile.skin_type,
+            sensitivities=profile.sensitivities or [],
+            preferred_brands=profile.preferred_brands or [],
+            budget_range=profile.budget_range,
+            concerns=profile.concerns or [],
+            version=profile.version or 0
+        )
+
+class ProfileCache:
+    """
+    user_id -> ProfileSnapshot (or None: the user has no profile yet), tagged
+    with the row version. `put` never replaces an entry with an older version,
+    so a request that read the row before a concurrent update cannot bring
+    the stale copy back. Writers put the new version after a successful CAS
+    update (rather than dropping the entry, which would lose that guard); the
+    TTL bounds staleness for updates made by other processes.
+    """
+
+    def __init__(self):
+        self._cache: TTLCache[str, Tuple[int, ProfileSnapshot | None]] = TTLCache(
+            "profile_cache", settings.PROFILE_CACHE_SIZE, settings.PROFILE_CACHE_TTL_SECONDS
+        )
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._cache
+
+    def get(self, user_id: str) -> ProfileSnapshot | None:
+        entry = self._cache.get(user_id)
+        return entry[1] if entry is not None else None
+
+    def put(self, user_id: str, profile: UserProfile | ProfileSnapshot | None) -> ProfileSnapshot | None:
+        """Cache the given row (None: no profile). Returns the snapshot now cached."""
+        snapshot = ProfileSnapshot.from_row(profile) if isinstance(profile, UserProfile) else profile
+        version = snapshot.version if snapshot is not None else 0
+        current = self._cache.peek(user_id)
+        if current is not None and current[0] > version:
+            metrics.incr("profile_cache.stale_puts")
+            return current[1]
+        self._cache.set(user_id, (version, snapshot))
+        return snapshot
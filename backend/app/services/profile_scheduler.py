@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from typing import Dict, List, Set
+from openai import AsyncOpenAI
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.metrics import metrics
+from app.models.user import Message, UserProfile
+from app.services.profile_agent import ProfileExtractionAgent
+from app.services.profile_cache import ProfileCache
+from app.services.session_registry import SessionRegistry
+
+logger = logging.getLogger(__name__)
+
+class ProfileExtractionScheduler:
+    """
+    Debounced, per-user profile extraction. Chat turns are counted per user; a
+    job is queued after PROFILE_EXTRACTION_TRIGGER_TURNS new turns or after
+    PROFILE_EXTRACTION_IDLE_SECONDS without one, whichever comes first. A user
+    is queued at most once: turns arriving while the job waits are folded into
+    it, and turns arriving while it runs queue one follow-up. Jobs run on
+    PROFILE_EXTRACTION_WORKERS worker tasks and only send the messages created
+    after `UserProfile.extracted_through`, so pending turns are never lost
+    across restarts — they are picked up by the user's next job.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI | None,
+        profile_cache: ProfileCache | None = None,
+        session_registry: SessionRegistry | None = None
+    ):
+        self.client = client
+        self.profile_cache = profile_cache
+        self.session_registry = session_registry
+        self._pending: Dict[str, int] = {}  # user_id -> turns since the last queued job
+        self._idle_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._queued: Set[str] = set()
+        self._running: Set[str] = set()
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        return settings.PROFILE_EXTRACTION_ENABLED and self.client is not None
+
+    def start(self) -> None:
+        if self.enabled and not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(settings.PROFILE_EXTRACTION_WORKERS)
+            ]
+
+    async def aclose(self) -> None:
+        for timer in self._idle_timers.values():
+            timer.cancel()
+        self._idle_timers.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def note_turn(self, user_id: str) -> None:
+        """Record one persisted chat turn for `user_id`."""
+        if not self.enabled:
+            return
+        metrics.incr("profile_extraction.turns")
+        if user_id in self._queued:
+            metrics.incr("profile_extraction.coalesced")
+            return
+
+        pending = self._pending.get(user_id, 0) + 1
+        self._pending[user_id] = pending
+        timer = self._idle_timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+        if pending >= settings.PROFILE_EXTRACTION_TRIGGER_TURNS:
+            self._enqueue(user_id)
+        else:
+            self._arm_idle_timer(user_id)
+
+    def _arm_idle_timer(self, user_id: str) -> None:
+        self._idle_timers[user_id] = asyncio.get_running_loop().call_later(
+            settings.PROFILE_EXTRACTION_IDLE_SECONDS, self._enqueue, user_id
+        )
+
+    def _enqueue(self, user_id: str) -> None:
+        self._idle_timers.pop(user_id, None)
+        turns = self._pending.pop(user_id, 0)
+        if user_id in self._queued:
+            return
+        self._queued.add(user_id)
+        metrics.observe("profile_extraction.turns_per_job", turns)
+        self._queue.put_nowait(user_id)
+        metrics.gauge("profile_extraction.queue_depth", self._queue.qsize())
+
+    async def _worker(self) -> None:
+        while True:
+            user_id = await self._queue.get()
+            metrics.gauge("profile_extraction.queue_depth", self._queue.qsize())
+            self._queued.discard(user_id)
+            if user_id in self._running:
+                # Another worker has this user; retry once it is idle again
+                if user_id not in self._idle_timers:
+                    self._arm_idle_timer(user_id)
+                continue
+            self._running.add(user_id)
+            try:
+                with metrics.timer("profile_extraction.job_ms"):
+                    async with async_session_maker() as session:
+                        await self.extract(session, user_id)
+            except Exception as e:
+                metrics.incr("profile_extraction.failures")
+                logger.warning(f"Profile extraction failed for {user_id}: {e}")
+            finally:
+                self._running.discard(user_id)
+
+    async def extract(self, session, user_id: str) -> bool:
+        """Extract from the user's messages since the watermark. Returns True if the profile was updated."""
+        profile = await session.scalar(select(UserProfile).where(UserProfile.user_id == user_id))
+        clause = Message.user_id == user_id
+        if profile is not None and profile.extracted_through is not None:
+            clause = clause & (Message.created_at > profile.extracted_through)
+
+        limit = settings.PROFILE_EXTRACTION_MAX_MESSAGES
+        result = await session.execute(
+            select(Message).where(clause).order_by(Message.created_at.asc()).limit(limit + 1)
+        )
+        rows = list(result.scalars().all())
+        if len(rows) > limit:
+            # Messages sharing the boundary timestamp wait for the next job so
+            # the `created_at >` watermark never splits a tie.
+            boundary = rows[-1].created_at
+            rows = [m for m in rows[:-1] if m.created_at < boundary]
+        if not rows:
+            return False
+
+        metrics.incr("profile_extraction.jobs")
+        metrics.observe("profile_extraction.messages_per_job", len(rows))
+        agent = ProfileExtractionAgent(
+            session, client=self.client, profile_cache=self.profile_cache, session_registry=self.session_registry
+        )
+        updated = await agent.extract_and_update(user_id, rows, extracted_through=rows[-1].created_at)
+        if not updated:
+            # Watermark not advanced: the same messages are retried by the next job
+            metrics.incr("profile_extraction.failures")
+        return updated
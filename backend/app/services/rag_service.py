@@ -1,69 +1,255 @@
-import json
-from app.core.vector_db import get_collection
-from app.schemas.product import Product
-from typing import List
+import asyncio
+import hashlib
+import numpy as np
+from app.core.batching import MicroBatcher
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.executors import BoundedExecutor, ExecutorSaturated
+from app.core.metrics import metrics
+from app.core.vector_db import VectorHit, VectorStore, get_vector_store, get_embedding_function, on_catalog_changed
+from app.schemas.product import BudgetRange, Product, ProductFilter, SkinType
+from app.services.lexical_index import LexicalIndex, product_matches
+from app.services.product_store import ProductStore
+from typing import List, Tuple
 from pydantic import BaseModel
 
 class RAGResult(BaseModel):
     products: List[Product]
     max_similarity: float
     below_threshold: bool
+    degraded: bool = False  # vector search was skipped (executor saturated or timed out)
+
+def create_vector_executor() -> BoundedExecutor:
+    return BoundedExecutor(
+        "vector_executor",
+        max_workers=settings.VECTOR_EXECUTOR_WORKERS,
+        queue_depth=settings.VECTOR_EXECUTOR_QUEUE_DEPTH,
+    )
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and case so near-identical queries share cache entries."""
+    return " ".join(query.split()).casefold()
+
+def embedding_key(embedding) -> str:
+    return hashlib.blake2b(np.asarray(embedding, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+
+# Budget -> price tiers a user on that budget is shown
+BUDGET_PRICE_RANGES = {
+    BudgetRange.BUDGET: [BudgetRange.BUDGET],
+    BudgetRange.MID_RANGE: [BudgetRange.BUDGET, BudgetRange.MID_RANGE],
+    BudgetRange.LUXURY: [],  # no ceiling
+}
+
+def profile_filter(profile) -> ProductFilter | None:
+    """
+    Hard retrieval constraints from the user profile: suitable for their skin
+    type, within budget, free of their sensitivities. Brand and concern
+    preferences stay soft (handled by the prompt) so they don't starve retrieval.
+    """
+    if profile is None or not settings.RAG_PROFILE_FILTERS_ENABLED:
+        return None
+    product_filter = ProductFilter()
+    if profile.skin_type in SkinType._value2member_map_:
+        product_filter.skin_types = [SkinType(profile.skin_type)]
+    if profile.budget_range in BudgetRange._value2member_map_:
+        product_filter.price_ranges = BUDGET_PRICE_RANGES[BudgetRange(profile.budget_range)]
+    product_filter.exclude_risk_ingredients = list(profile.sensitivities or [])
+    return None if product_filter.is_empty() else product_filter
 
 class RAGService:
-    def __init__(self, similarity_threshold: float = 0.7):
-        self.collection = get_collection()
+    def __init__(
+        self,
+        similarity_threshold: float = 0.7,
+        store: VectorStore | None = None,
+        executor: BoundedExecutor | None = None,
+        embedding_function=None,
+        product_store: ProductStore | None = None,
+        lexical_index: LexicalIndex | None = None
+    ):
+        self.embedding_function = embedding_function or get_embedding_function()
+        self.store = store or get_vector_store(embedding_function=self.embedding_function)
+        if product_store is None:
+            product_store = ProductStore(self.store)
+            on_catalog_changed(product_store.reload)
+        self.product_store = product_store
+
+        # Optional BM25 side of hybrid retrieval, fused with vector ranks via RRF
+        if lexical_index is None and settings.HYBRID_RETRIEVAL_ENABLED:
+            lexical_index = LexicalIndex(product_store)
+            on_catalog_changed(lexical_index.rebuild)
+        self.lexical_index = lexical_index if settings.HYBRID_RETRIEVAL_ENABLED else None
+        self.executor = executor or create_vector_executor()
         self.threshold = similarity_threshold
 
-    async def retrieve(self, query: str, top_k: int = 3) -> RAGResult:
+        # Concurrent retrievals share one vectorized embedding call and one batched search
+        self.embed_batcher = MicroBatcher(
+            "rag.embed", self._embed_batch,
+            window_ms=settings.EMBED_BATCH_WINDOW_MS, max_batch=settings.EMBED_BATCH_MAX_SIZE
+        )
+        self.query_batcher = MicroBatcher(
+            "rag.query", self._query_batch,
+            window_ms=settings.EMBED_BATCH_WINDOW_MS, max_batch=settings.EMBED_BATCH_MAX_SIZE
+        )
+
+        # Level 1 survives catalog changes (same model, same vector); level 2 does not
+        self.embedding_cache = TTLCache(
+            "rag.embedding_cache", settings.RAG_EMBEDDING_CACHE_SIZE, settings.RAG_EMBEDDING_CACHE_TTL_SECONDS
+        )
+        self.result_cache = TTLCache(
+            "rag.result_cache", settings.RAG_RESULT_CACHE_SIZE, settings.RAG_RESULT_CACHE_TTL_SECONDS
+        )
+        on_catalog_changed(self.result_cache.clear)
+
+    async def retrieve(self, query: str, top_k: int = 3, filters: ProductFilter | None = None) -> RAGResult:
         """
-        Query ChromaDB and return products above similarity threshold.
+        Query the vector store and return products above similarity threshold.
+        `filters` restricts the search to eligible products before scoring.
         """
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=top_k
-        )
-        
-        products = []
-        max_sim = 0.0
-        
-        if not results['ids'] or not results['ids'][0]:
+        if filters is not None:
+            filters = self.product_store.resolve_filter(filters)
+            if filters.is_empty():
+                filters = None
+
+        # Embedding (ONNX) and HNSW search are blocking; keep them off the event loop.
+        # On backpressure or timeout report "below threshold" so the caller falls
+        # back to web search instead of stalling the stream.
+        normalized = normalize_query(query)
+        try:
+            embedding = await self.embed(normalized)
+
+            result_key = (embedding_key(embedding), top_k, self.threshold, filters.cache_key() if filters else None)
+            cached = self.result_cache.get(result_key)
+            if cached is not None:
+                return cached
+
+            candidates = max(top_k, settings.HYBRID_CANDIDATES) if self.lexical_index else top_k
+            hits = await self.query_batcher.submit((embedding, candidates, filters))
+            if filters is not None and not hits:
+                hits = await self._filter_fallback(embedding, candidates, filters)
+            if self.lexical_index:
+                lexical_hits = await self.executor.run(
+                    self.lexical_index.search, normalized, settings.HYBRID_CANDIDATES, filters
+                )
+        except (ExecutorSaturated, asyncio.TimeoutError):
+            metrics.incr("rag.degraded")
+            return RAGResult(products=[], max_similarity=0.0, below_threshold=True, degraded=True)
+
+        if self.lexical_index:
+            result = self._build_hybrid_result(hits, lexical_hits, top_k)
+        else:
+            result = self._build_result(hits)
+        self.result_cache.set(result_key, result)
+        return result
+
+    async def _filter_fallback(self, embedding, candidates: int, filters: ProductFilter) -> List[VectorHit]:
+        """
+        Unfiltered search, filtered on the decoded products. Covers indexes written
+        before their metadata carried the filter flags, which match nothing.
+        """
+        metrics.incr("rag.filter_fallbacks")
+        pool = max(candidates, settings.RAG_FILTER_FALLBACK_CANDIDATES)
+        hits = await self.query_batcher.submit((embedding, pool, None))
+        eligible = []
+        for hit in hits:
+            product = self.product_store.get(hit.id)
+            if product is not None and product_matches(product, filters):
+                eligible.append(hit)
+                if len(eligible) == candidates:
+                    break
+        return eligible
+
+    async def embed(self, query: str) -> list:
+        """Cached, batched query embedding (shared with the local intent classifier)."""
+        normalized = normalize_query(query)
+        embedding = self.embedding_cache.get(normalized)
+        if embedding is None:
+            embedding = await self.embed_batcher.submit(normalized)
+            self.embedding_cache.set(normalized, embedding)
+        return embedding
+
+    async def embed_many(self, queries: List[str]) -> list:
+        """
+        Embed a batch of query texts in one executor call without the per-query
+        timeout, so the first call may also pay for loading the model (seed sets).
+        """
+        normalized = [normalize_query(query) for query in queries]
+        embeddings = list(await self.executor.run(self.embedding_function, normalized))
+        for key, embedding in zip(normalized, embeddings):
+            self.embedding_cache.set(key, embedding)
+        return embeddings
+
+    def _build_result(self, hits: List[VectorHit]) -> RAGResult:
+        """Turn one query's hits into products above the similarity threshold."""
+        if not hits:
             return RAGResult(products=[], max_similarity=0.0, below_threshold=True)
 
-        # ChromaDB returns distances. For cosine similarity, distance = 1 - similarity (approx).
-        # Actually Chroma defaults to L2, but we set "hnsw:space": "cosine" in get_collection.
-        # Cosine distance ranges from 0 (identical) to 2 (opposite).
-        # Similarity = 1 - distance.
-        
-        distances = results['distances'][0]
-        metadatas = results['metadatas'][0]
-        
-        valid_products = []
-        
-        for i, dist in enumerate(distances):
-            similarity = 1 - dist
-            max_sim = max(max_sim, similarity)
-            
-            if similarity >= self.threshold:
-                # Convert metadata back to Product
-                # Note: We stored simple types in metadata, need to handle Enum conversion if Pydantic doesn't automatically
-                try:
-                    # Deserialize lists from JSON strings
-                    meta = metadatas[i].copy()
-                    for key, value in meta.items():
-                        if isinstance(value, str) and (value.startswith("[") and value.endswith("]")):
-                            try:
-                                meta[key] = json.loads(value)
-                            except json.JSONDecodeError:
-                                pass
-                                
-                    product = Product.model_validate(meta)
-                    valid_products.append(product)
-                except Exception as e:
-                    print(f"Error parsing product metadata: {e}")
-                    continue
+        max_sim = max(hit.similarity for hit in hits)
+        matched_ids = [hit.id for hit in hits if hit.similarity >= self.threshold]
+        valid_products = self.product_store.resolve(matched_ids)
+        if len(valid_products) < len(matched_ids):
+            # Indexed after the store was last loaded; picked up on the next reload
+            metrics.incr("rag.product_store_misses")
 
         return RAGResult(
             products=valid_products,
             max_similarity=max_sim,
             below_threshold=len(valid_products) == 0
         )
+
+    def _build_hybrid_result(self, hits: List[VectorHit], lexical_hits: List[Tuple[str, float]], top_k: int) -> RAGResult:
+        """
+        Reciprocal rank fusion of vector and BM25 rankings. A product qualifies if
+        its vector similarity clears the threshold or its BM25 score reaches
+        HYBRID_LEXICAL_MIN_SCORE, so exact-ingredient queries are answered from
+        the catalog instead of falling through to web search; `below_threshold`
+        is set only when neither admits a product.
+        """
+        k = settings.HYBRID_RRF_K
+        fused = {}
+        for rank, hit in enumerate(hits):
+            fused[hit.id] = fused.get(hit.id, 0.0) + 1 / (k + rank + 1)
+        for rank, (product_id, _) in enumerate(lexical_hits):
+            fused[product_id] = fused.get(product_id, 0.0) + 1 / (k + rank + 1)
+
+        vector_ids = {hit.id for hit in hits if hit.similarity >= self.threshold}
+        lexical_ids = {
+            product_id for product_id, score in lexical_hits if score >= settings.HYBRID_LEXICAL_MIN_SCORE
+        }
+        ranked = sorted(vector_ids | lexical_ids, key=lambda product_id: fused[product_id], reverse=True)[:top_k]
+        if ranked and not vector_ids:
+            metrics.incr("rag.lexical_rescues")
+
+        valid_products = self.product_store.resolve(ranked)
+        return RAGResult(
+            products=valid_products,
+            max_similarity=max((hit.similarity for hit in hits), default=0.0),
+            below_threshold=len(valid_products) == 0
+        )
+
+    async def _embed_batch(self, queries: List[str]) -> list:
+        """Embed all queued query texts in one vectorized call."""
+        return list(await self.executor.run(
+            self.embedding_function, queries,
+            timeout=settings.VECTOR_QUERY_TIMEOUT_SECONDS
+        ))
+
+    async def _query_batch(self, requests: List[Tuple[list, int, ProductFilter | None]]) -> List[List[VectorHit]]:
+        """Search queued embeddings (one store call per distinct filter) and split the result back per caller."""
+        groups = {}
+        for i, (_, _, filters) in enumerate(requests):
+            groups.setdefault(filters.cache_key() if filters else None, []).append(i)
+
+        async def search(indexes: List[int]) -> None:
+            hits = await self.executor.run(
+                self.store.query,
+                [requests[i][0] for i in indexes],
+                max(requests[i][1] for i in indexes),
+                requests[indexes[0]][2],
+                timeout=settings.VECTOR_QUERY_TIMEOUT_SECONDS
+            )
+            for i, query_hits in zip(indexes, hits):
+                results[i] = query_hits[:requests[i][1]]
+
+        results: List[List[VectorHit]] = [[] for _ in requests]
+        await asyncio.gather(*(search(indexes) for indexes in groups.values()))
+        return results
@@ -0,0 +1,93 @@
+import itertools
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, NamedTuple, Set, Tuple
+import numpy as np
+from app.core.metrics import metrics
+
+class _Entry(NamedTuple):
+    bucket: Hashable
+    embedding: np.ndarray  # unit-normalized query embedding
+    response: str
+    expires_at: float
+
+def profile_bucket(profile) -> Tuple:
+    """The profile fields the prompt includes; users in the same bucket get the same context block."""
+    if profile is None:
+        return ()
+    return (
+        (profile.skin_type or "").casefold(),
+        (profile.budget_range or "").casefold(),
+        tuple(sorted(s.casefold() for s in profile.sensitivities or [])),
+        tuple(sorted(c.casefold() for c in profile.concerns or [])),
+    )
+
+class SemanticResponseCache:
+    """
+    Cache of finished assistant answers. An entry is reused when the new query
+    retrieved exactly the same products for the same profile bucket (the exact
+    part of the key) and its embedding has cosine similarity >= `threshold` with
+    the cached query. Bounded LRU over entries with a per-entry TTL; hits and
+    misses are counted under `<name>.*`. Event-loop only.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl_seconds: float, threshold: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl_seconds
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[Hashable, Set[int]] = {}
+        self._ids = itertools.count()
+
+    @staticmethod
+    def make_bucket(product_ids: List[str], profile) -> Hashable:
+        return (tuple(sorted(product_ids)), profile_bucket(profile))
+
+    def lookup(self, bucket: Hashable, embedding) -> str | None:
+        query = _unit(embedding)
+        now = time.monotonic()
+        best_id, best_similarity = None, self.threshold
+        for entry_id in list(self._buckets.get(bucket, ())):
+            entry = self._entries[entry_id]
+            if entry.expires_at <= now:
+                self._remove(entry_id)
+                continue
+            similarity = float(entry.embedding @ query)
+            if similarity >= best_similarity:
+                best_id, best_similarity = entry_id, similarity
+
+        if best_id is None:
+            metrics.incr(f"{self.name}.misses")
+            return None
+        self._entries.move_to_end(best_id)
+        metrics.incr(f"{self.name}.hits")
+        metrics.observe(f"{self.name}.hit_similarity", best_similarity)
+        return self._entries[best_id].response
+
+    def store(self, bucket: Hashable, embedding, response: str, ttl_seconds: float | None = None) -> None:
+        ttl = self.ttl if ttl_seconds is None else ttl_seconds
+        entry_id = next(self._ids)
+        self._entries[entry_id] = _Entry(bucket, _unit(embedding), response, time.monotonic() + ttl)
+        self._buckets.setdefault(bucket, set()).add(entry_id)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+            metrics.incr(f"{self.name}.evictions")
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._buckets[entry.bucket]
+        ids.discard(entry_id)
+        if not ids:
+            del self._buckets[entry.bucket]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def _unit(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
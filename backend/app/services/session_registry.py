@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+from typing import NamedTuple, Set
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.metrics import metrics
+from app.models.user import SessionToken, User
+from app.services.profile_cache import ProfileSnapshot
+
+logger = logging.getLogger(__name__)
+
+def hash_token(token: str) -> str:
+    """Tokens are only ever stored and keyed by their SHA-256."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _utcnow() -> datetime:
+    # Naive UTC, like the other DateTime columns
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class Principal(NamedTuple):
+    user: User  # detached; read-only use
+    profile: ProfileSnapshot | None
+
+class SessionRegistry:
+    """
+    Authenticated principals and token revocation. A validated token's user
+    and profile snapshot are cached by token hash for PRINCIPAL_CACHE_TTL_SECONDS
+    (never past the token's expiry), so repeat requests skip the JWT decode and
+    the user query. Logins are recorded in `session_tokens`; logout marks the
+    row invalidated. Revoked hashes are held in memory and reloaded from the
+    table every REVOCATION_REFRESH_SECONDS, so a logout on another worker takes
+    effect there within that interval.
+    """
+
+    def __init__(self):
+        self.principals: TTLCache[str, Principal] = TTLCache(
+            "auth.principal_cache", settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS
+        )
+        self.revoked: Set[str] = set()
+        self._local_revocations: Set[str] = set()  # since the last refresh started
+        self._refresher: asyncio.Task | None = None
+
+    def is_revoked(self, token_hash: str) -> bool:
+        return token_hash in self.revoked
+
+    def get_principal(self, token_hash: str) -> Principal | None:
+        return self.principals.get(token_hash)
+
+    def cache_principal(self, token_hash: str, principal: Principal, expires_at: float) -> None:
+        ttl = min(settings.PRINCIPAL_CACHE_TTL_SECONDS, expires_at - time.time())
+        if ttl > 0:
+            self.principals.set(token_hash, principal, ttl)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop every cached principal of `user_id`; called after a profile write so the snapshot is reloaded."""
+        for token_hash, principal, _ in self.principals.items():
+            if principal.user.id == user_id:
+                self.principals.invalidate(token_hash)
+
+    async def record_login(self, db: AsyncSession, token: str, user_id: str, expires_at: datetime) -> None:
+        db.add(SessionToken(token_hash=hash_token(token), user_id=user_id, expires_at=expires_at))
+        await db.commit()
+
+    async def revoke(self, db: AsyncSession, token: str, user_id: str, expires_at: datetime) -> None:
+        token_hash = hash_token(token)
+        result = await db.execute(
+            update(SessionToken)
+            .where(SessionToken.token_hash == token_hash)
+            .values(invalidated_at=func.coalesce(SessionToken.invalidated_at, _utcnow()))
+        )
+        if not result.rowcount:
+            # Issued before logins were recorded
+            db.add(SessionToken(token_hash=token_hash, user_id=user_id, expires_at=expires_at, invalidated_at=_utcnow()))
+        await db.commit()
+        self.revoked.add(token_hash)
+        self._local_revocations.add(token_hash)
+        self.principals.invalidate(token_hash)
+        metrics.incr("auth.revocations")
+
+    async def refresh_revocations(self) -> None:
+        # Local revocations racing with the query below are kept for one more cycle
+        local, self._local_revocations = self._local_revocations, set()
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(SessionToken.token_hash)
+                .where(SessionToken.invalidated_at.is_not(None), SessionToken.expires_at > _utcnow())
+            )
+            revoked = set(result.scalars().all())
+        # Swapped in one step; expired tokens drop out
+        self.revoked = revoked | local | self._local_revocations
+        for token_hash in revoked:
+            self.principals.invalidate(token_hash)
+        metrics.gauge("auth.revoked_tokens", len(self.revoked))
+
+    async def start(self) -> None:
+        await self.refresh_revocations()
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REVOCATION_REFRESH_SECONDS)
+            try:
+                await self.refresh_revocations()
+            except Exception as e:
+                logger.warning(f"Revocation refresh failed: {e}")
+
+    async def aclose(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
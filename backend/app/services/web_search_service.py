@@ -1,7 +1,14 @@
-from typing import List
+import asyncio
+from typing import List, Tuple
+import httpx
 from pydantic import BaseModel
-from tavily import TavilyClient, AsyncTavilyClient
 from app.core.config import settings
+from app.core.cache import TTLCache
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.clients import create_search_http_client
+from app.core.metrics import metrics
+from app.core.singleflight import SingleFlight
+from app.core.text import normalize_text
 
 class SearchResult(BaseModel):
     title: str
@@ -9,29 +16,80 @@ class SearchResult(BaseModel):
     snippet: str
 
 class WebSearchService:
-    def __init__(self):
-        self.client = AsyncTavilyClient(api_key=settings.TAVILY_API_KEY) if settings.TAVILY_API_KEY else None
+    """
+    Tavily search with a TTL result cache, single-flight coalescing of identical
+    concurrent queries, a hard per-call timeout and a circuit breaker. While
+    Tavily is failing or slow, callers get the last known (stale) result for
+    the query or an empty list instead of waiting.
+    """
+
+    def __init__(self, http_client: httpx.AsyncClient | None = None):
+        # Tavily is called over the shared keep-alive pool instead of the SDK,
+        # which opens a fresh HTTP client for every search.
+        self.client = (http_client or create_search_http_client()) if settings.TAVILY_API_KEY else None
+        self.cache: TTLCache[Tuple[str, int], List[SearchResult]] = TTLCache(
+            "web_search.cache", settings.WEB_SEARCH_CACHE_SIZE, settings.WEB_SEARCH_CACHE_TTL_SECONDS
+        )
+        self.stale: TTLCache[Tuple[str, int], List[SearchResult]] = TTLCache(
+            "web_search.stale", settings.WEB_SEARCH_CACHE_SIZE, settings.WEB_SEARCH_STALE_TTL_SECONDS
+        )
+        self.flights: SingleFlight[Tuple[str, int], List[SearchResult]] = SingleFlight("web_search")
+        self.breaker = CircuitBreaker(
+            "web_search.breaker", settings.WEB_SEARCH_BREAKER_FAILURES, settings.WEB_SEARCH_BREAKER_RESET_SECONDS
+        )
 
     async def search(self, query: str, max_results: int = 3) -> List[SearchResult]:
         """Search web using Tavily API."""
         if not self.client:
             return []
-            
+
+        key = (normalize_text(query) or query, max_results)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        return await self.flights.do(key, lambda: self._search_upstream(key, query, max_results))
+
+    async def _search_upstream(self, key: Tuple[str, int], query: str, max_results: int) -> List[SearchResult]:
+        if not self.breaker.allow():
+            return self.stale.get(key) or []
+
         try:
-            response = await self.client.search(
-                query=query,
-                max_results=max_results,
-                search_depth="basic"
-            )
-            
-            results = []
-            for result in response.get("results", []):
-                results.append(SearchResult(
-                    title=result.get("title", ""),
-                    url=result.get("url", ""),
-                    snippet=result.get("content", "")
-                ))
-            return results
+            with metrics.timer("web_search.upstream_ms"):
+                results = await asyncio.wait_for(
+                    self._post(query, max_results), timeout=settings.WEB_SEARCH_TIMEOUT_SECONDS
+                )
+        except asyncio.CancelledError:
+            # No outcome; otherwise a cancelled probe would leave the breaker half-open forever
+            self.breaker.record_cancelled()
+            raise
         except Exception as e:
-            print(f"Web search failed: {e}")
-            return []
+            self.breaker.record_failure()
+            metrics.incr("web_search.failures")
+            print(f"Web search failed: {e!r}")
+            return self.stale.get(key) or []
+
+        self.breaker.record_success()
+        self.cache.set(key, results)
+        self.stale.set(key, results)
+        return results
+
+    async def _post(self, query: str, max_results: int) -> List[SearchResult]:
+        response = await self.client.post(
+            "/search",
+            headers={"Authorization": f"Bearer {settings.TAVILY_API_KEY}"},
+            json={
+                "query": query,
+                "max_results": max_results,
+                "search_depth": "basic"
+            }
+        )
+        response.raise_for_status()
+
+        results = []
+        for result in response.json().get("results", []):
+            results.append(SearchResult(
+                title=result.get("title", ""),
+                url=result.get("url", ""),
+                snippet=result.get("content", "")
+            ))
+        return results
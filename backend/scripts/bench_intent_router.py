@@ -0,0 +1,83 @@
+"""
+Intent routing benchmark: keyword + LLM fallback vs keyword + local embedding
+classifier (+ LLM only when the local result is ambiguous).
+
+Runs offline against scripts/data/intent_eval.json. Unless --live-llm is given
+the LLM layer is simulated by an oracle that returns the labelled intent after
+--llm-latency-ms, so the baseline's accuracy is an upper bound and the
+interesting numbers are the LLM call rate and the latency.
+
+    cd backend && python -m scripts.bench_intent_router --llm-latency-ms 600
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.core.config import settings
+from app.services.intent_classifier import EmbeddingIntentClassifier
+from app.services.intent_router import IntentResult, IntentRouter, IntentType
+from app.services.rag_service import RAGService
+
+EVAL_PATH = os.path.join(os.path.dirname(__file__), "data", "intent_eval.json")
+
+class OracleLLMRouter(IntentRouter):
+    """IntentRouter whose LLM layer answers with the gold label after a fixed delay."""
+
+    def __init__(self, gold: dict, latency_ms: float, local_classifier=None):
+        super().__init__(client=object(), local_classifier=local_classifier)
+        self.gold = gold
+        self.latency = latency_ms / 1000
+
+    async def _llm_classify(self, query: str) -> IntentResult:
+        await asyncio.sleep(self.latency)
+        return IntentResult(intent=self.gold[query], confidence=0.95, used_llm_fallback=True)
+
+async def evaluate(router: IntentRouter, samples) -> dict:
+    correct = llm_calls = 0
+    latencies = []
+    for query, intent in samples:
+        start = time.perf_counter()
+        result = await router.classify(query)
+        latencies.append(time.perf_counter() - start)
+        correct += result.intent == intent
+        llm_calls += result.used_llm_fallback
+    latencies.sort()
+    n = len(samples)
+    return {
+        "accuracy": round(correct / n, 3),
+        "llm_call_rate": round(llm_calls / n, 3),
+        "mean_latency_ms": round(sum(latencies) / n * 1000, 2),
+        "p95_latency_ms": round(latencies[int(0.95 * (n - 1))] * 1000, 2),
+    }
+
+async def main(llm_latency_ms: float, live_llm: bool) -> None:
+    with open(EVAL_PATH, "r", encoding="utf-8") as f:
+        samples = [(item["query"], IntentType(item["intent"])) for item in json.load(f)]
+    gold = dict(samples)
+
+    rag_service = RAGService()
+    classifier = EmbeddingIntentClassifier(rag_service.embed, settings.INTENT_SEEDS_PATH, embed_seeds=rag_service.embed_many)
+    await classifier.load()
+
+    if live_llm:
+        routers = [("keyword+llm", IntentRouter()), ("keyword+local+llm", IntentRouter(local_classifier=classifier))]
+    else:
+        routers = [
+            ("keyword+llm", OracleLLMRouter(gold, llm_latency_ms)),
+            ("keyword+local+llm", OracleLLMRouter(gold, llm_latency_ms, local_classifier=classifier)),
+        ]
+
+    keyword_decided = sum(routers[0][1].keyword_classify(q) is not None for q, _ in samples)
+    print(f"{len(samples)} queries, keyword layer decides {keyword_decided}, "
+          f"local threshold={settings.INTENT_LOCAL_MIN_CONFIDENCE}, temperature={classifier.temperature}")
+    for label, router in routers:
+        print(label.ljust(20), await evaluate(router, samples))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare intent routing with and without the local classifier")
+    parser.add_argument("--llm-latency-ms", type=float, default=600.0, help="Simulated LLM round trip")
+    parser.add_argument("--live-llm", action="store_true", help="Call the configured LLM instead of the oracle")
+    args = parser.parse_args()
+    asyncio.run(main(args.llm_latency_ms, args.live_llm))
@@ -0,0 +1,85 @@
+"""
+Event-loop lag during a login storm, bcrypt inline vs on the password pool.
+
+A ticker coroutine sleeps --tick-ms in a loop and records how late it wakes
+up (what every streaming chat response on the worker would feel), while
+--logins concurrent password verifications run either inline on the loop
+(the old /login behaviour) or through PasswordHasher + KeyedAdmission, as
+/login does now. Reports loop lag, login latency and rejections (429s).
+
+    cd backend && python -m scripts.bench_login_storm --logins 50 --clients 10
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.admission import AdmissionRejected, KeyedAdmission
+from app.core.config import settings
+from app.core.executors import ExecutorSaturated
+from app.services.auth_service import AuthService, PasswordHasher
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)], 1) if ordered else 0.0
+
+async def storm(mode: str, logins: int, clients: int, tick_ms: float, password_hash: str) -> dict:
+    lags, latencies, rejected = [], [], 0
+    hasher = PasswordHasher()
+    depth = await hasher.calibrate()
+    admission = KeyedAdmission("bench.admission", settings.LOGIN_MAX_ACTIVE_PER_CLIENT, settings.LOGIN_MAX_WAITING_PER_CLIENT)
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(tick_ms / 1000)
+            lags.append((time.perf_counter() - start) * 1000 - tick_ms)
+
+    async def login(i: int):
+        nonlocal rejected
+        start = time.perf_counter()
+        if mode == "inline":
+            AuthService.verify_password("secret1", password_hash)
+        else:
+            try:
+                async with admission.admit(f"ip:10.0.0.{i % clients}"):
+                    await hasher.verify_and_update("secret1", password_hash)
+            except (AdmissionRejected, ExecutorSaturated, asyncio.TimeoutError):
+                rejected += 1
+                return
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick_task
+    hasher.executor.shutdown()
+    return {
+        "loop_lag_p50_ms": percentile(lags, 0.5),
+        "loop_lag_p99_ms": percentile(lags, 0.99),
+        "loop_lag_max_ms": percentile(lags, 1.0),
+        "login_p50_ms": percentile(latencies, 0.5),
+        "login_p99_ms": percentile(latencies, 0.99),
+        "rejected_429": rejected,
+        "queue_depth": depth if mode == "offloaded" else None,
+        "logins_per_s": round(len(latencies) / elapsed, 1),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Login storm event-loop lag benchmark")
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=10, help="distinct client IPs the logins come from")
+    parser.add_argument("--tick-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    password_hash = AuthService.get_password_hash("secret1")
+    print(f"bcrypt rounds={settings.BCRYPT_ROUNDS} workers={settings.PASSWORD_HASH_WORKERS} "
+          f"queue={settings.PASSWORD_HASH_QUEUE_DEPTH} logins={args.logins} clients={args.clients}")
+    for mode in ("inline", "offloaded"):
+        print(mode.ljust(10), asyncio.run(storm(mode, args.logins, args.clients, args.tick_ms, password_hash)))
+
+if __name__ == "__main__":
+    main()
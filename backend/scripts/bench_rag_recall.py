@@ -0,0 +1,66 @@
+"""
+Recall benchmark: vector-only vs hybrid (BM25 + vector, RRF) retrieval.
+
+Queries name an exact ingredient ("推荐含水杨酸的精华", "A醇 适合什么肤质");
+a product is relevant when its core_ingredients contain that ingredient.
+Reports hit-rate@k, precision@k, the share of queries that would fall back to
+web search (below_threshold) and mean latency, against the configured store.
+
+    cd backend && python -m scripts.bench_rag_recall --top-k 3
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services.ingestion_service import IngestionService
+from app.services.rag_service import RAGService
+
+TEMPLATES = ["推荐含{term}的{ptype}", "{term}适合什么肤质", "{term} {ptype}", "有没有{term}成分的产品"]
+
+def build_queries():
+    queries = []
+    for ingredient in IngestionService.INGREDIENTS_MAP:
+        chinese = ingredient.split("(")[0].strip()
+        aliases = ingredient.split("(")[1].rstrip(")").split("/")
+        for term in [chinese, *aliases]:
+            for template in TEMPLATES:
+                for ptype in IngestionService.PRODUCT_TYPES[:2]:
+                    queries.append((template.format(term=term, ptype=ptype), ingredient))
+    return list(dict.fromkeys(queries))
+
+async def evaluate(rag: RAGService, queries, top_k: int) -> dict:
+    hits = precision = fallbacks = 0
+    latency = 0.0
+    for query, ingredient in queries:
+        start = time.perf_counter()
+        result = await rag.retrieve(query, top_k=top_k)
+        latency += time.perf_counter() - start
+        relevant = [p for p in result.products if ingredient in p.core_ingredients]
+        hits += bool(relevant)
+        precision += len(relevant) / top_k
+        fallbacks += result.below_threshold
+    n = len(queries)
+    return {
+        f"hit_rate@{top_k}": round(hits / n, 3),
+        f"precision@{top_k}": round(precision / n, 3),
+        "web_fallback_rate": round(fallbacks / n, 3),
+        "mean_latency_ms": round(latency / n * 1000, 2),
+    }
+
+async def main(top_k: int) -> None:
+    queries = build_queries()
+    print(f"{len(queries)} queries, backend={settings.VECTOR_BACKEND}")
+    for label, hybrid in [("vector-only", False), ("hybrid", True)]:
+        settings.HYBRID_RETRIEVAL_ENABLED = hybrid
+        rag = RAGService()
+        # Warm the model and caches' code paths, then measure uncached
+        await rag.retrieve("warmup", top_k=top_k)
+        rag.embedding_cache.clear()
+        rag.result_cache.clear()
+        print(label, await evaluate(rag, queries, top_k))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--top-k", type=int, default=3)
+    asyncio.run(main(parser.parse_args().top_k))
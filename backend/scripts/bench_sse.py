@@ -0,0 +1,106 @@
+"""
+Server CPU per streamed token for SSE emission, per-chunk vs coalesced.
+
+Starts a uvicorn server (in a subprocess, so its CPU is measured alone) whose
+endpoint streams a fake LLM reply of 1-2 character deltas through
+`coalesce_deltas` + `sse_frame` into a StreamingResponse, exactly like
+ChatService. The parent opens --streams concurrent SSE connections per mode
+and reports server CPU per token, frames per token and bytes on the wire.
+Run once with and once without orjson installed to compare the encoders.
+Server CPU per token varies by ~20% between runs, so compare several runs
+before reading anything into a CPU difference; frames and bytes are stable.
+
+    cd backend && python -m scripts.bench_sse --streams 50 --flush-ms 0 25 50
+"""
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from app.core import sse
+from app.core.sse import coalesce_deltas, sse_frame
+
+REPLY = "建议先做皮肤测试，敏感肌可以选择含神经酰胺的温和保湿产品，避免高浓度酸类。" * 4
+
+app = FastAPI()
+
+async def fake_llm(interval_ms: float, rng: random.Random):
+    i = 0
+    while i < len(REPLY):
+        step = rng.choice((1, 2))
+        await asyncio.sleep(interval_ms / 1000)
+        yield REPLY[i:i + step]
+        i += step
+
+@app.get("/stream")
+async def stream(flush_ms: float, max_bytes: int, interval_ms: float, seed: int):
+    async def frames():
+        async for piece in coalesce_deltas(fake_llm(interval_ms, random.Random(seed)), flush_ms, max_bytes):
+            yield sse_frame({"content": piece})
+        yield sse_frame({"done": True})
+    return StreamingResponse(frames(), media_type="text/event-stream")
+
+@app.get("/cpu")
+async def cpu():
+    return {"cpu": time.process_time()}
+
+async def run(client: httpx.AsyncClient, streams: int, flush_ms: float, max_bytes: int, interval_ms: float) -> dict:
+    async def one(seed: int) -> tuple:
+        frames, wire_bytes = 0, 0
+        params = {"flush_ms": flush_ms, "max_bytes": max_bytes, "interval_ms": interval_ms, "seed": seed}
+        async with client.stream("GET", "/stream", params=params) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    frames += 1
+                    wire_bytes += len(line.encode()) + 2
+        return frames, wire_bytes
+
+    cpu_start = (await client.get("/cpu")).json()["cpu"]
+    results = await asyncio.gather(*(one(s) for s in range(streams)))
+    cpu = (await client.get("/cpu")).json()["cpu"] - cpu_start
+    tokens = streams * len(REPLY)  # ~1 character per token for CJK text
+    return {
+        "server_cpu_us_per_token": round(cpu / tokens * 1e6, 1),
+        "frames_per_token": round(sum(f for f, _ in results) / tokens, 3),
+        "wire_bytes_per_token": round(sum(b for _, b in results) / tokens, 1),
+    }
+
+async def main(args) -> None:
+    limits = httpx.Limits(max_connections=args.streams, max_keepalive_connections=args.streams)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+        for _ in range(50):
+            try:
+                await client.get("/cpu")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        # Warm-up so imports and connection setup are not billed to the first mode
+        await run(client, args.streams, 0, args.max_bytes, args.interval_ms)
+        for flush_ms in args.flush_ms:
+            mode = "per-chunk" if flush_ms <= 0 else f"coalesced {flush_ms:g}ms"
+            print(mode.ljust(18), await run(client, args.streams, flush_ms, args.max_bytes, args.interval_ms))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SSE frame coalescing benchmark")
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--interval-ms", type=float, default=5.0, help="delay between upstream deltas")
+    parser.add_argument("--flush-ms", type=float, nargs="+", default=[0, 25, 50, 100])
+    parser.add_argument("--max-bytes", type=int, default=512)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    print(f"encoder={'orjson' if hasattr(sse, 'orjson') else 'json'} streams={args.streams} interval_ms={args.interval_ms}")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "scripts.bench_sse:app", "--port", str(args.port), "--log-level", "warning"]
+    )
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.terminate()
+        server.wait()
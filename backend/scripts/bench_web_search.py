@@ -0,0 +1,61 @@
+"""
+Trending-query burst against WebSearchService, pointed at the Tavily stub.
+
+Fires --users concurrent searches for --queries distinct (near-identical
+spellings of the same) topics and reports upstream calls, latency and the
+behaviour while the stub is failing (circuit breaker + stale results).
+
+    cd backend && python -m scripts.tavily_stub --port 8765 &
+    TAVILY_API_KEY=stub TAVILY_BASE_URL=http://127.0.0.1:8765 python -m scripts.bench_web_search
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.services.web_search_service import WebSearchService
+
+SPELLINGS = ["{topic}", "{topic}？", " {topic} ", "{topic}!"]
+
+async def burst(service: WebSearchService, users: int, topics: int) -> dict:
+    queries = [SPELLINGS[i % len(SPELLINGS)].format(topic=f"2025新品防晒{i % topics}") for i in range(users)]
+    latencies = []
+
+    async def one(query: str) -> int:
+        start = time.perf_counter()
+        results = await service.search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        return len(results)
+
+    counts = await asyncio.gather(*(one(q) for q in queries))
+    latencies.sort()
+    return {
+        "searches": users,
+        "empty": sum(1 for c in counts if c == 0),
+        "p50_ms": round(latencies[len(latencies) // 2], 1),
+        "max_ms": round(latencies[-1], 1),
+    }
+
+async def main(users: int, topics: int) -> None:
+    async with httpx.AsyncClient(base_url=settings.TAVILY_BASE_URL) as admin:
+        async def phase(label: str, service: WebSearchService, delay_ms: float, failure_rate: float) -> None:
+            await admin.post("/config", json={"delay_ms": delay_ms, "failure_rate": failure_rate})
+            report = await burst(service, users, topics)
+            report["upstream_calls"] = (await admin.get("/stats")).json()["total"]
+            print(label.ljust(28), report)
+
+        service = WebSearchService()
+        await phase("cold burst", service, 200, 0.0)
+        await phase("warm burst (cached)", service, 200, 0.0)
+        service.cache.clear()
+        await phase("outage (stale results)", service, 200, 1.0)
+        await phase("slow upstream (breaker open)", service, settings.WEB_SEARCH_TIMEOUT_SECONDS * 2000, 0.0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Web search coalescing / breaker benchmark")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--topics", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.topics))
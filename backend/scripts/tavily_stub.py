@@ -0,0 +1,62 @@
+"""
+Local stand-in for the Tavily search API, for tests and load experiments.
+
+POST /search answers with canned results after --delay-ms and fails with a 503
+for --failure-rate of the calls. GET /stats reports how many searches reached
+it; POST /config changes delay/failure rate at runtime (e.g. to simulate an
+outage mid-test).
+
+    cd backend && python -m scripts.tavily_stub --port 8765 --delay-ms 300
+    TAVILY_API_KEY=stub TAVILY_BASE_URL=http://127.0.0.1:8765 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+class StubConfig(BaseModel):
+    delay_ms: float = 200.0
+    failure_rate: float = 0.0
+
+app = FastAPI(title="Tavily stub")
+config = StubConfig()
+calls: Counter = Counter()
+
+@app.post("/search")
+async def search(body: dict):
+    query = body.get("query", "")
+    calls[query] += 1
+    await asyncio.sleep(config.delay_ms / 1000)
+    if random.random() < config.failure_rate:
+        raise HTTPException(status_code=503, detail="stub failure")
+    return {
+        "query": query,
+        "results": [
+            {"title": f"{query} - result {i}", "url": f"https://example.com/{i}", "content": f"Stub content {i} for {query}"}
+            for i in range(body.get("max_results", 3))
+        ],
+    }
+
+@app.get("/stats")
+async def stats():
+    return {"total": sum(calls.values()), "per_query": dict(calls)}
+
+@app.post("/config")
+async def update_config(update: StubConfig):
+    global config
+    config = update
+    calls.clear()
+    return config
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Tavily stub server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=float, default=200.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    config = StubConfig(delay_ms=args.delay_ms, failure_rate=args.failure_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,33 @@
+"""IntentRouter memoizes model decisions but never the blind default."""
+import asyncio
+
+from app.core.config import settings
+from app.services.intent_router import IntentResult, IntentRouter, IntentType
+
+class StubClassifier:
+    ready = True
+
+    def __init__(self):
+        self.calls = 0
+
+    async def classify(self, query: str) -> IntentResult:
+        self.calls += 1
+        return IntentResult(intent=IntentType.PRODUCT_KNOWLEDGE, confidence=0.9, used_llm_fallback=False)
+
+def make_router(monkeypatch, local_classifier=None) -> IntentRouter:
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "")
+    return IntentRouter(local_classifier=local_classifier)
+
+def test_blind_default_is_not_memoized(monkeypatch):
+    router = make_router(monkeypatch)
+    result = asyncio.run(router.classify("xyzzy plugh"))
+    assert result.intent == IntentType.GENERAL_CHAT and result.confidence == 0.5
+    assert router.memo_lookup("xyzzy plugh") is None
+
+def test_local_classifier_result_is_memoized(monkeypatch):
+    classifier = StubClassifier()
+    router = make_router(monkeypatch, classifier)
+    first = asyncio.run(router.classify("xyzzy plugh"))
+    second = asyncio.run(router.classify("xyzzy plugh"))
+    assert first == second and first.intent == IntentType.PRODUCT_KNOWLEDGE
+    assert classifier.calls == 1
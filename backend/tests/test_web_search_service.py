@@ -0,0 +1,118 @@
+"""
+WebSearchService against a stubbed Tavily endpoint (httpx.MockTransport):
+single-flight coalescing, circuit breaker opening, and the half-open probe
+slot being released when the probe is cancelled.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.web_search_service import WebSearchService
+
+RESULTS = {"results": [{"title": "Tavily stub", "url": "https://example.com", "content": "stub"}]}
+
+class StubTavily:
+    """Counts /search calls; `status` and `delay` can change between calls."""
+
+    def __init__(self, status: int = 200, delay: float = 0.0):
+        self.status = status
+        self.delay = delay
+        self.calls = 0
+        self.release = asyncio.Event()  # set to let a hanging call finish
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.delay < 0:
+            await self.release.wait()
+        elif self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return httpx.Response(self.status, json={"detail": "stub failure"})
+        return httpx.Response(200, json=RESULTS)
+
+@pytest.fixture(autouse=True)
+def tavily_settings(monkeypatch):
+    monkeypatch.setattr(settings, "TAVILY_API_KEY", "test")
+    monkeypatch.setattr(settings, "WEB_SEARCH_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(settings, "WEB_SEARCH_BREAKER_RESET_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "WEB_SEARCH_TIMEOUT_SECONDS", 2.0)
+
+def make_service(stub: StubTavily) -> WebSearchService:
+    client = httpx.AsyncClient(base_url="http://tavily.test", transport=httpx.MockTransport(stub))
+    return WebSearchService(http_client=client)
+
+def test_concurrent_identical_queries_share_one_call():
+    async def scenario():
+        stub = StubTavily(delay=0.05)
+        service = make_service(stub)
+        results = await asyncio.gather(*(service.search("烟酰胺 精华") for _ in range(5)))
+        # Whitespace/case variants normalize to the same key
+        again = await service.search("烟酰胺  精华")
+        return stub, results, again
+
+    stub, results, again = asyncio.run(scenario())
+    assert stub.calls == 1
+    assert all(r == results[0] for r in results)
+    assert results[0][0].title == "Tavily stub"
+    assert again == results[0]
+
+def test_breaker_opens_after_consecutive_failures():
+    async def scenario():
+        stub = StubTavily(status=503)
+        service = make_service(stub)
+        first = [await service.search(f"query {i}") for i in range(2)]
+        opened = service.breaker.is_open
+        calls_when_opened = stub.calls
+        rejected = await service.search("query 3")
+        return stub, first, opened, calls_when_opened, rejected
+
+    stub, first, opened, calls_when_opened, rejected = asyncio.run(scenario())
+    assert first == [[], []]
+    assert opened
+    assert rejected == []
+    # While open, nothing reaches Tavily
+    assert stub.calls == calls_when_opened == 2
+
+def test_stale_result_served_while_open():
+    async def scenario():
+        stub = StubTavily()
+        service = make_service(stub)
+        fresh = await service.search("防晒", max_results=3)
+        service.cache.clear()
+        stub.status = 503
+        await service.search("other 1")
+        await service.search("other 2")
+        assert service.breaker.is_open
+        return fresh, await service.search("防晒", max_results=3)
+
+    fresh, stale = asyncio.run(scenario())
+    assert fresh and stale == fresh
+
+def test_cancelled_probe_releases_half_open_slot(monkeypatch):
+    async def scenario():
+        stub = StubTavily(status=503)
+        service = make_service(stub)
+        await service.search("a")
+        await service.search("b")
+        assert service.breaker.is_open
+
+        # Reset period over: the next call is the single half-open probe, and it hangs
+        monkeypatch.setattr(service.breaker, "reset_seconds", 0.0)
+        stub.status, stub.delay = 200, -1
+        probe = asyncio.create_task(service._search_upstream(("c", 3), "c", 3))
+        await asyncio.sleep(0.01)
+        assert stub.calls == 3
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        # The slot is free again: the next caller probes, succeeds and closes the circuit
+        stub.delay = 0.0
+        results = await service.search("d")
+        return stub, service, results
+
+    stub, service, results = asyncio.run(scenario())
+    assert stub.calls == 4
+    assert results and not service.breaker.is_open